@@ -0,0 +1,393 @@
+# Application factory shared by main.py (the whole site) and app.py (contact form)
+# An app is built from route groups: 'auth' (login, registration, the home page),
+# 'maps' (building pages, map images and tiles, map and events APIs) and
+# 'contact' (the contact form, plus the staff export and triage views when auth
+# is present). A group imports its modules only when it is registered, after
+# .env has been loaded, so a process serving maps and login never loads the
+# submission stack, and pyodbc is imported on the first SQL Server connection.
+import os
+import sqlite3
+import logging
+import secrets
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort
+
+logger = logging.getLogger(__name__)
+
+GROUPS = ('auth', 'maps', 'contact')
+REQUIRES = {'auth': ('maps',)}  # the page after login is the campus home page
+
+# File types the catch-all route serves from the working directory
+SERVED_FILE_TYPES = ('.html', '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico')
+
+
+def create_app(groups=GROUPS, theme='main'):
+    """Flask app serving the given route groups; theme picks the contact form colours"""
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown route groups: {', '.join(sorted(unknown))}")
+    groups = set(groups)
+    for group in list(groups):
+        groups.update(REQUIRES.get(group, ()))
+
+    # Settings first: most modules read their environment variables when imported
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # Configure logging: records are queued and written to app.log by a background thread
+    import logging_setup
+    logging_setup.setup_logging()
+
+    import metrics
+    import secret_key
+    from static_cache import StaticCache
+    from asset_bundles import asset_bundles, bundles
+
+    app = Flask(__name__)
+    app.config['ROUTE_GROUPS'] = tuple(group for group in GROUPS if group in groups)
+    # Monitoring endpoints are local-only unless a token is configured
+    app.config['STATS_TOKEN'] = os.getenv("STATS_TOKEN", "")
+    # Contact form submissions: 'direct' inserts on the request, 'spool' queues for a background writer,
+    # 'async' inserts on the bounded database executor
+    app.config['SUBMISSION_MODE'] = os.getenv("SUBMISSION_MODE", "direct").lower()
+
+    # Per-route latency histograms and internal timings, exposed on /metrics
+    metrics.init_app(app)
+    app.secret_key = secret_key.load_secret_key()  # SECRET_KEY, or a key persisted in SECRET_KEY_FILE
+
+    # Shared CSS/JS bundles, served under fingerprinted URLs (/assets/site.<hash>.css)
+    app.register_blueprint(asset_bundles)
+    app.jinja_env.globals['asset_url'] = bundles.url
+
+    # Pages and images are served from the working directory through an in-memory cache
+    static_assets = StaticCache(os.getcwd(), rewrite_html=bundles.rewrite)
+
+    # Sections of /stats, added to by each group
+    sections = {'static_cache': static_assets.stats, 'logging': logging_setup.stats}
+
+    building_pages = _register_maps(app, sections) if 'maps' in groups else None
+    if 'auth' in groups:
+        _register_auth(app, sections, building_pages)
+    if 'contact' in groups:
+        _register_contact(app, sections, static_assets, theme)
+    elif 'auth' not in groups:
+        # Maps only: the home page is public
+        from buildings import HOME
+        app.add_url_rule('/', 'home', lambda: building_pages.serve(HOME))
+    _register_common(app, sections, static_assets, building_pages)
+
+    logger.info(f"App created with route groups: {', '.join(app.config['ROUTE_GROUPS'])}")
+    return app
+
+
+def _register_maps(app, sections):
+    """Building pages, map images and tiles, map hit-testing and building events"""
+    from buildings import BuildingPages
+    from campus_map import map_api
+    from map_tiles import map_tiles
+    import events
+
+    # Home and building pages are rendered from the building registry and kept in memory
+    building_pages = BuildingPages(app)
+
+    # Map hit-test API (/api/locate, /api/nearest, /api/locate/batch)
+    app.register_blueprint(map_api)
+
+    # Scaled WebP/PNG map variants and map tiles (/map/..., /tiles/...)
+    app.register_blueprint(map_tiles)
+
+    # Per-building events: now / next / overlapping slot (/api/buildings/<code>/events...)
+    app.register_blueprint(events.events_api)
+
+    sections['events'] = events.stats
+    return building_pages
+
+
+def _register_auth(app, sections, building_pages):
+    """Server-side sessions, login, registration, password reset and the logged-in home page"""
+    import rate_limiter
+    import session_store
+    import user_store
+    import password_hasher
+    from buildings import HOME
+
+    # Sessions live server-side (sessions.db) behind an in-memory cache; the cookie holds only a signed id
+    app.session_interface = session_store.session_store
+
+    # Every launcher gets the users table, not only `python main.py`
+    user_store.init_db()
+
+    sections.update({'rate_limiter': rate_limiter.stats, 'password_hasher': password_hasher.stats,
+                  'sessions': session_store.stats, 'user_store': user_store.stats})
+
+    # Show a friendly page instead of a 500 when the user database or hashing pool is saturated
+    @app.errorhandler(user_store.UserStoreBusy)
+    @app.errorhandler(password_hasher.HasherBusy)
+    def service_busy(e):
+        return render_template('error.html', error='The service is busy right now.'), 503
+
+    # Route: Home (requires login)
+    @app.route('/')
+    def home():
+        if 'user_id' not in session:
+            return redirect(url_for('login'))
+
+        return building_pages.serve(HOME, private=True)
+
+    # Route: Login
+    @app.route('/login', methods=['GET', 'POST'])
+    def login():
+        if request.method == 'POST':
+            email = request.form['email']
+            password = request.form['password']
+
+            # Apply rate limiting
+            client_ip = request.remote_addr
+            if rate_limiter.is_rate_limited('login', client_ip):
+                flash('Too many login attempts. Please try again later.', 'danger')
+                return render_template('login.html', error=True)
+
+            # Check user in the database
+            user = user_store.get_credentials(email)
+
+            if user:
+                password_ok, new_hash = password_hasher.verify(user[1], password)
+            else:
+                password_ok, new_hash = False, None
+
+            if password_ok:
+                if new_hash:
+                    # Stored hash used outdated parameters; upgrade it transparently
+                    user_store.update_password(user[0], new_hash)
+                    logger.info(f"Upgraded password hash for {email}")
+                # New session id on login; the user's id and email are cached with the session
+                session.regenerate()
+                session['user_id'] = user[0]
+                session['email'] = email
+                logger.info(f"Successful login for {email}")
+                return redirect(url_for('home'))
+            else:
+                logger.warning(f"Failed login attempt for {email}")
+                return render_template('login.html', error=True)
+
+        return render_template('login.html', error=False)
+
+    # Route: Register
+    @app.route('/register', methods=['GET', 'POST'])
+    def register():
+        if request.method == 'POST':
+            email = request.form['email']
+            password = request.form['password']
+            confirm_password = request.form['confirm-password']
+
+            # Apply rate limiting
+            client_ip = request.remote_addr
+            if rate_limiter.is_rate_limited('register', client_ip):
+                flash('Too many registration attempts. Please try again later.', 'danger')
+                return render_template('register.html', email_exists=False)
+
+            if password != confirm_password:
+                flash('Passwords do not match.', 'danger')
+                return redirect(url_for('register'))
+
+            # Known duplicates are refused before paying for the password hash
+            if user_store.email_registered(email):
+                logger.warning(f"Registration attempt with existing email: {email}")
+                return render_template('register.html', email_exists=True)
+
+            hashed_password = password_hasher.hash_password(password)
+
+            # Insert user into the database
+            try:
+                user_store.create_user(email, hashed_password)
+                logger.info(f"New user registered: {email}")
+                flash('Registration successful! Please log in.', 'success')
+                return redirect(url_for('login'))
+            except sqlite3.IntegrityError:
+                logger.warning(f"Registration attempt with existing email: {email}")
+                return render_template('register.html', email_exists=True)
+
+        return render_template('register.html', email_exists=False)
+
+    # Route: Forgot Password
+    @app.route('/forgot-password', methods=['GET', 'POST'])
+    def forgot_password():
+        if request.method == 'POST':
+            email = request.form['email']
+
+            # Apply rate limiting
+            client_ip = request.remote_addr
+            if rate_limiter.is_rate_limited('forgot_password', client_ip):
+                flash('Too many password reset attempts. Please try again later.', 'danger')
+                return render_template('forgotpassword.html', email_exists=None)
+
+            # Check if the email exists in the database
+            if user_store.user_exists(email):
+                logger.info(f"Password reset requested for {email}")
+                return render_template('forgotpassword.html', email_exists=True, redirect_to_login=True)
+            else:
+                logger.warning(f"Password reset attempted for non-existent email: {email}")
+                return render_template('forgotpassword.html', email_exists=False, email_not_found=True)
+
+        return render_template('forgotpassword.html', email_exists=None)
+
+    # Route: Logout
+    @app.route('/logout')
+    def logout():
+        if 'user_id' in session:
+            logger.info(f"User {session['user_id']} logged out")
+        session.pop('user_id', None)
+        session.pop('email', None)
+        flash('You have been logged out.', 'success')
+        return redirect(url_for('login'))
+
+
+def _register_contact(app, sections, static_assets, theme):
+    """The contact form and its submission, and the staff views over submissions when auth is present"""
+    import rate_limiter
+    import submission_schema
+    import submission_dedupe
+    import submission_store
+    import submission_spool
+    import db_executor
+    from db_pool import get_pool
+    from response_pages import ResponsePages
+
+    with_auth = 'auth' in app.config['ROUTE_GROUPS']
+    submission_mode = app.config['SUBMISSION_MODE']
+
+    # Contact form responses, compiled once instead of per request
+    if with_auth:
+        pages = ResponsePages(app, theme=theme, success_link='/', success_link_text='Return to Home',
+                              form_link='/contact-us')
+    else:
+        pages = ResponsePages(app, theme=theme, success_link='/', success_link_text='Return to Contact Form',
+                              form_link='/')
+
+    sections.update({'sql_pool': lambda: get_pool().stats(), 'rate_limiter': rate_limiter.stats,
+                  'submission_store': submission_store.stats, 'submission_dedupe': submission_dedupe.stats})
+    if submission_mode == 'spool':
+        sections['submission_spool'] = submission_spool.stats
+    elif submission_mode == 'async':
+        sections['db_executor'] = db_executor.stats
+
+    if with_auth:
+        import submission_export
+        import submission_triage
+
+        # Staff export of contact submissions, streamed as CSV or NDJSON (/api/submissions/export)
+        app.register_blueprint(submission_export.submission_export)
+
+        # Staff triage: keyset-paginated submission list and bulk status changes (/staff/submissions)
+        app.register_blueprint(submission_triage.submission_triage)
+
+        sections['submission_export'] = submission_export.stats
+    else:
+        # Route: the contact form is the whole site
+        app.add_url_rule('/', 'contact_index', lambda: static_assets.serve('Contact Us.html'))
+
+    # Route: Contact Us
+    @app.route('/contact-us')
+    def contact_form():
+        return static_assets.serve('Contact Us.html')
+
+    # Route to handle form submission
+    @app.route('/submit-form', methods=['POST'])
+    def submit_form():
+        try:
+            # Apply rate limiting
+            client_ip = request.remote_addr
+            if rate_limiter.is_rate_limited('submit', client_ip):
+                return "Too many submissions, please try again later", 429
+
+            # Decode and validate the whole form (or a JSON body) in one pass
+            if request.is_json:
+                submission, errors = submission_schema.from_json(request.get_data())
+            else:
+                submission, errors = submission_schema.from_form(request.form)
+            if errors:
+                error_message = submission_schema.error_message(errors)
+                logger.warning(error_message)
+                if request.is_json:
+                    return jsonify({'errors': submission_schema.errors_json(errors)}), 400
+                return pages.validation_error(error_message)
+            name, student_id, email = submission.name, submission.student_id, submission.email
+            subject, details = submission.subject, submission.details
+
+            # A repeat of an accepted submission gets the same response without another write
+            idempotency_key = request.headers.get('Idempotency-Key') or request.form.get(submission_dedupe.KEY_FIELD)
+            key = submission_dedupe.submission_key(email, subject, details, idempotency_key)
+            with submission_dedupe.claim(key) as first:
+                if not first:
+                    logger.info(f"Repeated form submission from {email} answered from the dedupe cache")
+                elif submission_mode == 'spool':
+                    # Durably queue the submission; the spool worker writes it to SQL Server
+                    submission_spool.enqueue(name, student_id, email, subject, details, client_ip)
+                    logger.info(f"Queued form submission from {email}")
+                elif submission_mode == 'async':
+                    # Insert on the bounded database executor; gives up after DB_CALL_TIMEOUT
+                    db_executor.call(db_executor.insert_submission, name, student_id, email, subject, details,
+                                     client_ip)
+                    logger.info(f"Successfully saved form submission from {email}")
+                else:
+                    # Student upsert and submission insert in one parameterized round trip
+                    submission_store.save(submission_store.SubmissionRow(name, student_id, email, subject, details,
+                                                                         None, client_ip))
+
+                    # Log successful submission (without personal details)
+                    logger.info(f"Successfully saved form submission from {email}")
+
+            # Return success message
+            if request.is_json:
+                return jsonify({'status': 'received'}), 201
+            return pages.success()
+
+        except (db_executor.DatabaseBusy, submission_dedupe.SubmissionPending) as e:
+            # SQL Server is slow or the executor is full: fail fast rather than hold the thread.
+            # A retry of a submission whose timed-out insert may still commit is refused the same way
+            logger.warning(f"Form submission rejected: {e}")
+            return pages.failure(), 503
+
+        except Exception as e:
+            # Log the error (without exposing details to user)
+            logger.error(f"Error in form submission: {str(e)}")
+
+            # Return generic error message (without exposing exception details)
+            return pages.failure()
+
+
+def _register_common(app, sections, static_assets, building_pages):
+    """/stats and the files in the working directory"""
+
+    # Route: runtime statistics for monitoring under load
+    @app.route('/stats')
+    def stats():
+        token = request.headers.get('X-Stats-Token', '')
+        stats_token = app.config['STATS_TOKEN']
+        if request.remote_addr not in ('127.0.0.1', '::1') and not (
+                stats_token and secrets.compare_digest(token, stats_token)):
+            abort(403)
+        return jsonify({name: section() for name, section in sections.items()})
+
+    # Route to serve static files
+    @app.route('/<path:filename>')
+    def serve_files(filename):
+        # Prevent directory traversal attacks
+        if '..' in filename or filename.startswith('/'):
+            logger.warning(f"Attempted directory traversal: {filename}")
+            return "Invalid file path", 400
+
+        # Only pages, styles, scripts and images; never the databases, logs or secret key next to them
+        if not filename.lower().endswith(SERVED_FILE_TYPES):
+            return "File type not allowed", 403
+
+        # Building pages (and Home.html) come from the registry
+        if building_pages is not None and filename.endswith('.html'):
+            response = building_pages.serve(filename[:-len('.html')])
+            if response is not None:
+                return response
+
+        try:
+            return static_assets.serve(filename)
+        except Exception as e:
+            logger.error(f"Error serving {filename}: {e}")
+            return f"File not found: {filename}", 404
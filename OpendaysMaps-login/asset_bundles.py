@@ -0,0 +1,112 @@
+# Fingerprinted CSS/JS bundles shared by the pages
+# The sources in assets/ are minified and hashed once at startup. Pages refer to
+# the logical name (/assets/site.css); templates get the hashed URL through
+# asset_url() and static HTML is rewritten when it is loaded, so browsers can
+# cache the bundles forever and only the page markup is fetched again.
+import os
+import re
+import gzip
+import hashlib
+import logging
+from flask import Blueprint, Response, request, abort
+
+logger = logging.getLogger(__name__)
+
+ASSET_SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+# bundle name -> source files, concatenated in order
+BUNDLES = {
+    'site.css': ('site.css',),
+    'site.js': ('site.js',),
+}
+ASSET_URL_PREFIX = '/assets/'
+IMMUTABLE_MAX_AGE = 31536000  # one year
+MIMETYPES = {'.css': 'text/css', '.js': 'text/javascript'}
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """Conservative: drops comment-only lines, indentation and blank lines"""
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+class _Bundle:
+    __slots__ = ('body', 'gzip', 'etag', 'mimetype')
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.gzip = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.mimetype = mimetype
+
+
+class AssetBundles:
+    """Builds every bundle once and maps logical names to fingerprinted URLs"""
+
+    def __init__(self, source_dir=ASSET_SOURCE_DIR, bundles=BUNDLES):
+        self._bundles = {}  # served name (logical or fingerprinted) -> _Bundle
+        self._urls = {}     # logical name -> fingerprinted URL
+        for name, sources in bundles.items():
+            stem, ext = os.path.splitext(name)
+            text = '\n'.join(_read(os.path.join(source_dir, source)) for source in sources)
+            bundle = _Bundle(MINIFIERS[ext](text).encode('utf-8'), MIMETYPES[ext])
+            fingerprinted = f"{stem}.{bundle.etag[:10]}{ext}"
+            self._bundles[name] = self._bundles[fingerprinted] = bundle
+            self._urls[name] = ASSET_URL_PREFIX + fingerprinted
+            logger.info(f"Bundle {fingerprinted}: {len(text)} -> {len(bundle.body)} bytes")
+        names = '|'.join(re.escape(name) for name in bundles)
+        self._reference = re.compile(rf'(["\']){re.escape(ASSET_URL_PREFIX)}({names})\1'.encode('utf-8'))
+
+    def url(self, name):
+        """Fingerprinted URL for a logical bundle name, for templates"""
+        return self._urls[name]
+
+    def rewrite(self, html):
+        """Replace logical bundle references in an HTML page (bytes) with fingerprinted URLs"""
+        return self._reference.sub(
+            lambda m: m.group(1) + self._urls[m.group(2).decode('utf-8')].encode('utf-8') + m.group(1), html)
+
+    def serve(self, name):
+        bundle = self._bundles.get(name)
+        if bundle is None:
+            abort(404)
+        encoded = bool(request.accept_encodings['gzip'])
+        response = Response(bundle.gzip if encoded else bundle.body, mimetype=bundle.mimetype)
+        response.set_etag(f"{bundle.etag}-gzip" if encoded else bundle.etag)
+        response.vary.add('Accept-Encoding')
+        if encoded:
+            response.content_encoding = 'gzip'
+        if name in self._urls:
+            # Logical names can change content between deployments, so they are revalidated
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response.make_conditional(request)
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+# Built once at import, before any page is rendered
+bundles = AssetBundles()
+
+asset_bundles = Blueprint('asset_bundles', __name__)
+
+
+@asset_bundles.route(ASSET_URL_PREFIX + '<name>')
+def asset(name):
+    return bundles.serve(name)
@@ -0,0 +1,78 @@
+// Shared scripts for the building pages
+
+// Clock
+function Time() {
+    const Day = new Date();
+    let hour = Day.getHours();
+    let min = Day.getMinutes();
+    let sec = Day.getSeconds();
+    min = TimeCheck(min);
+    sec = TimeCheck(sec);
+    document.getElementById('clock1').innerHTML = hour + ":" + min + ":" + sec;
+    setTimeout(Time, 1000);
+}
+
+function TimeCheck(i) {
+    return (i < 10) ? "0" + i : i;
+}
+
+// Keep the events list current; the server answers unchanged polls with 304
+function LoadEvents(code) {
+    fetch('/api/buildings/' + code + '/events/next?n=10')
+        .then(function (response) { return response.ok ? response.json() : null; })
+        .then(function (data) {
+            if (data && data.events.length) {
+                document.getElementById('Home').value = data.events.map(function (e) {
+                    return e.start.slice(11) + '-' + e.end.slice(11) + ' ' + e.room + ': ' + e.title;
+                }).join('\n');
+            }
+        })
+        .catch(function () {});
+}
+
+// Staff triage: set the status of the ticked submissions in one request
+function ApplyTriageStatus() {
+    const ids = Array.from(document.querySelectorAll('.TriageRow:checked')).map(function (box) {
+        return parseInt(box.value, 10);
+    });
+    if (!ids.length) {
+        return;
+    }
+    fetch('/api/submissions/status', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ids: ids, status: document.getElementById('TriageStatus').value})
+    }).then(function (response) {
+        if (response.ok) {
+            window.location.reload();
+        }
+    });
+}
+
+// Contact form: one key per form load, so a double-click or a resubmitted POST is recognised as a repeat
+function SetIdempotencyKey() {
+    const field = document.querySelector('input[name="idempotency_key"]');
+    if (field && !field.value) {
+        field.value = window.crypto && crypto.randomUUID ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+}
+
+window.addEventListener('load', function () {
+    SetIdempotencyKey();
+    if (document.getElementById('clock1')) {
+        Time();
+    }
+    const apply = document.getElementById('TriageApply');
+    if (apply) {
+        apply.addEventListener('click', ApplyTriageStatus);
+        document.getElementById('TriageAll').addEventListener('change', function (e) {
+            document.querySelectorAll('.TriageRow').forEach(function (box) { box.checked = e.target.checked; });
+        });
+    }
+    const code = document.body.dataset.building;
+    if (code) {
+        LoadEvents(code);
+        setInterval(LoadEvents, 60000, code);
+    }
+});
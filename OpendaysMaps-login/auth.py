@@ -0,0 +1,15 @@
+# Who the logged-in user is allowed to be: shared by the staff-only views
+import os
+from flask import session
+import user_store
+
+STAFF_EMAILS = {e.strip().lower() for e in os.getenv("STAFF_EMAILS", "").split(',') if e.strip()}
+
+
+def is_staff():
+    """True if the logged-in user's email is listed in STAFF_EMAILS"""
+    user_id = session.get('user_id')
+    if user_id is None or not STAFF_EMAILS:
+        return False
+    email = session.get('email') or user_store.get_email(user_id)  # cached in the session since login
+    return email is not None and email.lower() in STAFF_EMAILS
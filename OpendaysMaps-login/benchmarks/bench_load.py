@@ -0,0 +1,288 @@
+# Load test for main.py and app.py with a local SQL Server stand-in
+#
+# Drives both apps through the Flask test client and through a real threaded
+# WSGI server on localhost. pyodbc is replaced by benchmarks/fake_pyodbc.py
+# (SQLite), with optional injected latency. Each scenario reports throughput and
+# p50/p99 latency; with --baseline the run fails if a recorded baseline regresses.
+#
+#   python benchmarks/bench_load.py [--apps main app] [--modes client server]
+#       [--requests 300] [--concurrency 8] [--db-latency-ms 0] [--connect-latency-ms 0]
+#       [--baseline benchmarks/baseline.json [--record]] [--tolerance 0.25]
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import http.client
+import itertools
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+BENCH_EMAIL = 'bench.user@wlv.ac.uk'
+BENCH_PASSWORD = 'Bench-password-1'
+SUBMISSION = {'Name': 'Bench User', 'ID': '1234567', 'Email': 'bench@wlv.ac.uk',
+              'Subject': 'Open day question', 'Details': 'Where is the MA building?'}
+
+_ids = itertools.count()
+
+
+def _form(data):
+    return urlencode(data), {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def _submission_form():
+    """A new submission each time, so every request is a real write rather than a dedupe cache hit"""
+    n = next(_ids)
+    return _form({**SUBMISSION, 'Details': f"{SUBMISSION['Details']} ({os.getpid()}.{n})"})
+
+
+def _register_form():
+    n = next(_ids)
+    return _form({'email': f'bench{n}.{os.getpid()}@wlv.ac.uk', 'password': BENCH_PASSWORD,
+                  'confirm-password': BENCH_PASSWORD})
+
+
+# scenario -> (method, path, body factory or None, expected status codes)
+SCENARIOS = {
+    'main': {
+        'login': ('POST', '/login', lambda: _form({'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}), {302}),
+        'register': ('POST', '/register', _register_form, {302}),
+        'submit_form': ('POST', '/submit-form', _submission_form, {200}),
+        'submit_repeat': ('POST', '/submit-form', lambda: _form(SUBMISSION), {200}),
+        'static': ('GET', '/contact-us', None, {200}),
+        'map_page': ('GET', '/MA.html', None, {200}),
+    },
+    'app': {
+        'submit_form': ('POST', '/submit-form', _submission_form, {200}),
+        'submit_repeat': ('POST', '/submit-form', lambda: _form(SUBMISSION), {200}),
+        'static': ('GET', '/Contact Us.html', None, {200}),
+        'map_page': ('GET', '/MA.html', None, {200}),
+    },
+}
+
+
+def prepare_environment(workdir, args):
+    """Point every local database at workdir and swap in the SQL Server stand-in"""
+    os.environ.update({
+        'USERS_DATABASE': os.path.join(workdir, 'users.db'),
+        'SPOOL_DATABASE': os.path.join(workdir, 'submission_spool.db'),
+        'RATE_LIMIT_DATABASE': os.path.join(workdir, 'ratelimit.db'),
+        'EVENTS_DATABASE': os.path.join(workdir, 'events.db'),
+        'SUBMISSIONS_DATABASE': os.path.join(workdir, 'submissions.db'),
+        'SESSION_DATABASE': os.path.join(workdir, 'sessions.db'),
+        'MAP_CACHE_DIR': os.path.join(workdir, 'map_cache'),
+        'LOG_FILE': os.path.join(workdir, 'app.log'),
+        'FAKE_ODBC_DATABASE': os.path.join(workdir, 'sqlserver.db'),
+    })
+    if args.submission_mode:
+        os.environ['SUBMISSION_MODE'] = args.submission_mode
+
+    import fake_pyodbc
+    fake_pyodbc.configure(connect_latency=args.connect_latency_ms / 1000, query_latency=args.db_latency_ms / 1000,
+                          database=os.environ['FAKE_ODBC_DATABASE'])
+    fake_pyodbc.install()
+
+    # The apps serve pages and images from the working directory
+    os.chdir(ROOT)
+
+
+def load_apps(names):
+    import rate_limiter
+    import user_store
+    import password_hasher
+    import submission_spool
+
+    # Every request comes from one address; limits would turn the run into a 429 benchmark
+    for endpoint in rate_limiter.ENDPOINT_LIMITS:
+        rate_limiter.ENDPOINT_LIMITS[endpoint] = (10 ** 9, 60)
+
+    user_store.init_db()
+    if user_store.get_credentials(BENCH_EMAIL) is None:
+        user_store.create_user(BENCH_EMAIL, password_hasher.hash_password(BENCH_PASSWORD))
+
+    apps = {}
+    for name in names:
+        module = __import__(name)
+        apps[name] = module.app
+    if os.getenv('SUBMISSION_MODE', 'direct').lower() == 'spool':
+        submission_spool.start_worker()
+    return apps
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, len(ordered) * pct // 100)] if ordered else 0.0
+
+
+class ServerThread:
+    """The app on a real threaded werkzeug server, on an ephemeral localhost port"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+def client_runner(app):
+    local = threading.local()
+
+    def request(method, path, body, headers):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        response = client.open(path, method=method, data=body, headers=headers)
+        response.close()
+        return response.status_code
+    return request
+
+
+def server_runner(port):
+    def request(method, path, body, headers):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            conn.request(method, path.replace(' ', '%20'), body=body, headers=headers or {})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+    return request
+
+
+def run_scenario(send, scenario, requests, concurrency):
+    method, path, make_body, expected = scenario
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        body, headers = make_body() if make_body else (None, None)
+        start = time.perf_counter()
+        try:
+            status = send(method, path, body, headers)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status not in expected:
+                errors += 1
+
+    # Warm caches and connections before measuring
+    for _ in range(min(5, requests)):
+        one(None)
+    latencies.clear()
+    errors = 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 1),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions: p99 more than tolerance above, or throughput more than tolerance below"""
+    failures = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            failures.append(f"{key}: p99 {result['p99_ms']}ms vs baseline {base['p99_ms']}ms")
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            failures.append(f"{key}: {result['throughput_rps']} req/s vs baseline {base['throughput_rps']} req/s")
+        if result['errors'] > base['errors']:
+            failures.append(f"{key}: {result['errors']} errors vs baseline {base['errors']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test main.py and app.py against a SQLite SQL Server stand-in')
+    parser.add_argument('--apps', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--modes', nargs='+', choices=['client', 'server'], default=['client', 'server'])
+    parser.add_argument('--scenarios', nargs='+', help='limit to these scenarios (default: all)')
+    parser.add_argument('--requests', type=int, default=300, help='measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--db-latency-ms', type=float, default=0, help='injected latency per SQL Server statement')
+    parser.add_argument('--connect-latency-ms', type=float, default=0, help='injected latency per SQL Server connect')
+    parser.add_argument('--submission-mode', choices=['direct', 'spool', 'async'])
+    parser.add_argument('--baseline', help='JSON file of earlier results to compare against')
+    parser.add_argument('--record', action='store_true', help='write the results to --baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression (default 0.25)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='opendays-bench-')
+    try:
+        prepare_environment(workdir, args)
+        apps = load_apps(args.apps)
+
+        results = {}
+        print(f"{'app':<6}{'mode':<8}{'scenario':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for name, app in apps.items():
+            for mode in args.modes:
+                server = ServerThread(app) if mode == 'server' else None
+                if server:
+                    server.__enter__()
+                send = server_runner(server.port) if server else client_runner(app)
+                try:
+                    for scenario_name, scenario in SCENARIOS[name].items():
+                        if args.scenarios and scenario_name not in args.scenarios:
+                            continue
+                        result = run_scenario(send, scenario, args.requests, args.concurrency)
+                        results[f'{name}/{mode}/{scenario_name}'] = result
+                        print(f"{name:<6}{mode:<8}{scenario_name:<14}{result['throughput_rps']:>10}"
+                              f"{result['p50_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}")
+                finally:
+                    if server:
+                        server.__exit__()
+    finally:
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and args.record:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        if failures:
+            print("Regressions against baseline:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Benchmark: per-request cost of the contact form response pages
+#
+# Compares the old inline render_template_string pages with response_pages
+# (prebuilt success/failure bytes, cached compiled validation template).
+#
+#   python benchmarks/bench_response_pages.py [--iterations 5000]
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from flask import Flask, render_template_string
+from response_pages import ResponsePages
+
+OLD_SUCCESS_PAGE = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Submission Successful</title>
+        <style>
+            body {
+                background-color: #F5F5F5;
+                font-family: Arial, sans-serif;
+                text-align: center;
+                padding: 50px;
+            }
+            .success-message {
+                background-color: #003A70;
+                border-radius: 10px;
+                padding: 30px;
+                max-width: 600px;
+                margin: 0 auto;
+                color: #FFD100;
+            }
+            a {
+                display: inline-block;
+                margin-top: 20px;
+                padding: 15px 30px;
+                background-color: #FFD100;
+                color: #003A70;
+                text-decoration: none;
+                border-radius: 10px;
+                font-weight: bold;
+            }
+            a:hover {
+                background-color: #e6be00;
+            }
+        </style>
+    </head>
+    <body>
+        <div class='success-message'>
+            <h2>Thank you for your submission!</h2>
+            <p>We have received your inquiry and will respond shortly.</p>
+            <a href='/'>Return to Home</a>
+        </div>
+    </body>
+    </html>
+"""
+
+OLD_VALIDATION_PAGE = OLD_SUCCESS_PAGE.replace('success-message', 'error-message').replace(
+    '<h2>Thank you for your submission!</h2>', '<h2>Form Validation Error</h2>').replace(
+    '<p>We have received your inquiry and will respond shortly.</p>', '<p>{{ error }}</p>')
+
+
+def per_call_us(fn, iterations):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark contact form response pages')
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = Flask(__name__, template_folder=os.path.join(ROOT, 'templates'))
+    pages = ResponsePages(app, theme='main', success_link='/', success_link_text='Return to Home', form_link='/contact-us')
+    error = "Validation errors: Invalid email format"
+
+    with app.test_request_context('/submit-form', method='POST'):
+        cases = [
+            ('success', lambda: render_template_string(OLD_SUCCESS_PAGE), pages.success),
+            ('validation', lambda: render_template_string(OLD_VALIDATION_PAGE, error=error),
+             lambda: pages.validation_error(error)),
+        ]
+        print(f"{'page':<12}{'before us':>12}{'after us':>12}{'speedup':>10}")
+        for name, before_fn, after_fn in cases:
+            before = per_call_us(before_fn, args.iterations)
+            after = per_call_us(after_fn, args.iterations)
+            print(f"{name:<12}{before:>12.1f}{after:>12.1f}{before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# Benchmark: cold start of the app factory per route group set
+#
+# Each run is a fresh interpreter that imports app_factory and calls create_app,
+# as a new worker or a scaled-from-zero instance would. Reports the best start-up
+# time over --repeat runs, the modules loaded, and whether the heavy imports
+# (pyodbc, Pillow, msgspec) were loaded at start-up and after the first contact
+# form submission. pyodbc is replaced by benchmarks/fake_pyodbc.py (SQLite).
+#
+#   python benchmarks/bench_startup.py [--repeat 5] [--groups all auth,maps maps contact,maps contact]
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ('pyodbc', 'PIL', 'msgspec')
+DEFAULT_GROUPS = ['all', 'auth,maps', 'maps', 'contact,maps', 'contact']
+
+# Found first as pyodbc, so the stand-in is loaded exactly when the real driver would be
+PYODBC_STAND_IN = "import sys, fake_pyodbc\nsys.modules[__name__] = fake_pyodbc\n"
+
+# Runs in the child interpreter: argv[1] is the comma-separated groups, argv[2] '1' to submit the form once
+CHILD = r'''
+import sys, time, json
+baseline = len(sys.modules)
+start = time.perf_counter()
+from app_factory import create_app
+app = create_app(tuple(sys.argv[1].split(',')))
+elapsed = time.perf_counter() - start
+result = {'ms': elapsed * 1000, 'modules': len(sys.modules) - baseline,
+          'startup': [m for m in %(heavy)r if m in sys.modules]}
+if sys.argv[2] == '1':
+    response = app.test_client().post('/submit-form', data={
+        'Name': 'Bench User', 'ID': '1234567', 'Email': 'bench@wlv.ac.uk',
+        'Subject': 'Open day question', 'Details': 'Where is the MA building?'})
+    result['submit_status'] = response.status_code
+    result['after_submit'] = [m for m in %(heavy)r if m in sys.modules]
+print(json.dumps(result))
+''' % {'heavy': HEAVY_MODULES}
+
+
+def child_environment(workdir):
+    """Local databases and the pyodbc stand-in in workdir, so runs never touch the real ones"""
+    with open(os.path.join(workdir, 'pyodbc.py'), 'w') as f:
+        f.write(PYODBC_STAND_IN)
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': os.pathsep.join([workdir, ROOT, BENCH_DIR, env.get('PYTHONPATH', '')]),
+        'USERS_DATABASE': os.path.join(workdir, 'users.db'),
+        'SPOOL_DATABASE': os.path.join(workdir, 'submission_spool.db'),
+        'RATE_LIMIT_DATABASE': os.path.join(workdir, 'ratelimit.db'),
+        'EVENTS_DATABASE': os.path.join(workdir, 'events.db'),
+        'SUBMISSIONS_DATABASE': os.path.join(workdir, 'submissions.db'),
+        'SESSION_DATABASE': os.path.join(workdir, 'sessions.db'),
+        'MAP_CACHE_DIR': os.path.join(workdir, 'map_cache'),
+        'LOG_FILE': os.path.join(workdir, 'app.log'),
+        'SECRET_KEY_FILE': os.path.join(workdir, 'secret_key'),
+        'FAKE_ODBC_DATABASE': os.path.join(workdir, 'sqlserver.db'),
+    })
+    return env
+
+
+def run_child(groups, submit, env):
+    out = subprocess.run([sys.executable, '-c', CHILD, groups, '1' if submit else '0'], cwd=ROOT, env=env,
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.exit(f"create_app({groups}) failed:\n{out.stderr.strip()}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time create_app in fresh interpreters per route group set')
+    parser.add_argument('--groups', nargs='+', default=DEFAULT_GROUPS,
+                        help="comma-separated route groups per run, or 'all' (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per group set')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='opendays-startup-')
+    try:
+        env = child_environment(workdir)
+        print(f"{'groups':<18}{'start ms':>10}{'modules':>9}  {'heavy at start':<22}{'after first submit'}")
+        for groups in args.groups:
+            names = 'auth,maps,contact' if groups == 'all' else groups
+            runs = [run_child(names, False, env) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r['ms'])
+            after = '-'
+            if 'contact' in names.split(','):
+                submitted = run_child(names, True, env)
+                after = f"{', '.join(submitted['after_submit']) or 'none'} (HTTP {submitted['submit_status']})"
+            print(f"{groups:<18}{best['ms']:>10.1f}{best['modules']:>9}  "
+                  f"{', '.join(best['startup']) or 'none':<22}{after}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Benchmark: login lookups and registrations with several WSGI-style threads
+#
+# Compares the old pattern (sqlite3.connect per query, rollback journal) with
+# user_store (persistent per-thread connections, WAL, cached statements).
+#
+#   python benchmarks/bench_user_store.py [--users 5000] [--seconds 3] [--threads 1 4 8]
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import itertools
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import user_store
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def seed(path, count):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.executemany("INSERT INTO users (email, password) VALUES (?, ?)",
+                     ((f"user{i}@example.com", "x" * 100) for i in range(count)))
+    conn.commit()
+    conn.close()
+
+
+def naive_login(path, email):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, password FROM users WHERE email = ?", (email,))
+    user = cursor.fetchone()
+    conn.close()
+    return user
+
+
+def naive_register(path, email):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("INSERT INTO users (email, password) VALUES (?, ?)", (email, "x" * 100))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(threads, seconds, operation):
+    """Call operation(thread_no, i) from N threads for a fixed time; returns ops/s"""
+    stop = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(n):
+        for i in itertools.count():
+            if time.perf_counter() >= stop:
+                break
+            operation(n, i)
+            counts[n] += 1
+        user_store.close_connection()
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the SQLite user store')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        naive_db = os.path.join(tmp, 'naive.db')
+        store_db = os.path.join(tmp, 'store.db')
+        seed(naive_db, args.users)
+        seed(store_db, args.users)
+        user_store.SQLITE_DATABASE = store_db
+
+        print(f"{'scenario':<12}{'threads':>8}{'naive ops/s':>14}{'store ops/s':>14}{'speedup':>10}")
+        for threads in args.threads:
+            email = lambda n, i: f"user{(n * 7919 + i) % args.users}@example.com"
+            before = run(threads, args.seconds, lambda n, i: naive_login(naive_db, email(n, i)))
+            after = run(threads, args.seconds, lambda n, i: user_store.get_credentials(email(n, i)))
+            print(f"{'login':<12}{threads:>8}{before:>14.0f}{after:>14.0f}{after / before:>9.1f}x")
+
+            tag = f"t{threads}"
+            before = run(threads, args.seconds, lambda n, i: naive_register(naive_db, f"new-{tag}-{n}-{i}@example.com"))
+            after = run(threads, args.seconds, lambda n, i: user_store.create_user(f"new-{tag}-{n}-{i}@example.com", "x" * 100))
+            print(f"{'register':<12}{threads:>8}{before:>14.0f}{after:>14.0f}{after / before:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Benchmark: contact form validation, old validate_* functions vs submission_schema
+#
+# Generates a mix of valid and invalid submissions, checks both implementations
+# agree on every row, then times them (single rows and validate_many in bulk).
+#
+#   python benchmarks/bench_validation.py [--rows 20000] [--invalid 0.2]
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import submission_schema
+
+
+# The per-field validators submit_form used before the schema
+def validate_name(name):
+    if not name or len(name) > 100:
+        return False
+    return bool(re.match(r'^[A-Za-z0-9\s\-\'\.]{1,100}$', name))
+
+
+def validate_student_id(student_id):
+    if not student_id:
+        return True
+    return bool(re.match(r'^[0-9]{7,8}$', student_id))
+
+
+def validate_email(email):
+    if not email or len(email) > 120:
+        return False
+    return bool(re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email))
+
+
+def validate_subject(subject):
+    if not subject or len(subject) > 200:
+        return False
+    return bool(re.match(r'^[A-Za-z0-9\s\-\'\.,:;!?()]{1,200}$', subject))
+
+
+def validate_details(details):
+    return details is not None and len(details) <= 2000
+
+
+def old_validate(form):
+    name = form.get('Name', '').strip()
+    student_id = form.get('ID', '').strip()
+    email = form.get('Email', '').strip()
+    subject = form.get('Subject', '').strip()
+    details = form.get('Details', '').strip()
+    errors = []
+    if not validate_name(name):
+        errors.append("Invalid name format")
+    if not validate_student_id(student_id):
+        errors.append("Invalid student ID format")
+    if not validate_email(email):
+        errors.append("Invalid email format")
+    if not validate_subject(subject):
+        errors.append("Invalid subject format")
+    if not validate_details(details):
+        errors.append("Details too long or invalid")
+    return errors
+
+
+def make_rows(count, invalid_share, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = {'Name': f' Student {i} ', 'ID': str(1000000 + i), 'Email': f'student{i}@wlv.ac.uk',
+               'Subject': 'Open day: parking?', 'Details': 'Where can visitors park on the day?'}
+        if rng.random() < invalid_share:
+            field = rng.choice(['Name', 'ID', 'Email', 'Subject', 'Details'])
+            row[field] = {'Name': 'Bad<name>', 'ID': '12ab', 'Email': 'not-an-email',
+                          'Subject': 'x' * 201, 'Details': 'y' * 2001}[field]
+        rows.append(row)
+    return rows
+
+
+def bench(label, fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<40} {best * 1000:9.1f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the old validators with submission_schema')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--invalid', type=float, default=0.2, help='share of invalid rows')
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.invalid)
+    for row in rows:
+        _, errors = submission_schema.from_form(row)
+        assert [e.message for e in errors] == old_validate(row), row
+    print(f"{args.rows} rows, both implementations agree on every row")
+
+    old = bench("validate_* functions, per row", lambda: [old_validate(r) for r in rows])
+    new = bench("submission_schema.from_form, per row", lambda: [submission_schema.from_form(r) for r in rows])
+    bulk = bench("submission_schema.validate_many", lambda: submission_schema.validate_many(rows, by_form_name=True))
+    print(f"speedup: {old / new:.1f}x per row, {old / bulk:.1f}x bulk")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+# SQLite-backed stand-in for pyodbc, for benchmarks off the Windows SQL Server box
+#
+# Implements the small part of the pyodbc API the apps use (connect, cursors,
+# execute/executemany, commit/rollback and the exception classes) on top of one
+# SQLite file, translating the few T-SQL constructs the apps send (multi-statement
+# batches, MERGE upserts, SELECT TOP). Connect and query latency can be injected to mimic a remote or
+# degraded SQL Server. Call install() before importing main or app.
+import os
+import re
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+CONNECT_LATENCY = float(os.getenv("FAKE_ODBC_CONNECT_LATENCY", "0"))  # seconds per connect()
+QUERY_LATENCY = float(os.getenv("FAKE_ODBC_QUERY_LATENCY", "0"))  # seconds per execute()/executemany()
+DATABASE = os.getenv("FAKE_ODBC_DATABASE", os.path.join(tempfile.gettempdir(), "fake_sqlserver.db"))
+
+_settings = {'connect_latency': CONNECT_LATENCY, 'query_latency': QUERY_LATENCY, 'database': DATABASE}
+_init_lock = threading.Lock()
+_initialized = set()
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS contact_submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        student_id TEXT NOT NULL,
+        email TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        subject_id INTEGER,
+        details TEXT,
+        submission_date TEXT NOT NULL,
+        ip_address TEXT,
+        status TEXT NOT NULL DEFAULT 'New',
+        last_updated TEXT
+    );
+    CREATE TABLE IF NOT EXISTS students (
+        student_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS subjects (
+        subject_id INTEGER PRIMARY KEY,
+        subject_name TEXT NOT NULL UNIQUE,
+        department TEXT,
+        priority INTEGER NOT NULL DEFAULT 3
+    );
+    CREATE INDEX IF NOT EXISTS IX_contact_submissions_date ON contact_submissions (submission_date);
+    CREATE INDEX IF NOT EXISTS IX_contact_submissions_status ON contact_submissions (status, submission_date);
+'''
+
+# T-SQL spellings the apps use, and their SQLite equivalents
+_TRANSLATIONS = [(re.compile(r'\bGETDATE\(\)', re.I), 'CURRENT_TIMESTAMP'),
+                 (re.compile(r'\bSYSDATETIME\(\)', re.I), 'CURRENT_TIMESTAMP'),
+                 (re.compile(r'\bCAST\(\? AS datetime\)', re.I), '?')]
+# SELECT TOP (?) ...: the row limit is the first parameter, SQLite wants LIMIT ? at the end
+_TOP = re.compile(r'\bSELECT\s+TOP\s*\(\?\)', re.I)
+_NOCOUNT = re.compile(r'^\s*SET\s+NOCOUNT\s+(ON|OFF)\s*$', re.I)
+# MERGE t USING (VALUES ...) AS s (cols) ON t.key = s.key [WHEN MATCHED THEN UPDATE ...] WHEN NOT MATCHED THEN INSERT
+_MERGE = re.compile(r'^\s*MERGE\s+(\w+)\s+(?:WITH\s*\(HOLDLOCK\)\s+)?AS\s+\w+\s+USING\s*\(VALUES\s*(.*?)\)\s+AS\s+(\w+)\s*'
+                    r'\(([^)]*)\)\s+ON\s+\w+\.(\w+)\s*=\s*\w+\.\w+\s+(?:WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+(.*?)\s+)?'
+                    r'WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\b.*$', re.I | re.S)
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+
+
+class Error(Exception):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+def _translate_error(e):
+    if isinstance(e, sqlite3.IntegrityError):
+        return IntegrityError(str(e))
+    if isinstance(e, sqlite3.OperationalError):
+        return OperationalError(str(e))
+    if isinstance(e, sqlite3.ProgrammingError):
+        return ProgrammingError(str(e))
+    return DatabaseError(str(e))
+
+
+def _merge_to_upsert(match):
+    table, values, source, columns, key, assignments = match.groups()
+    if assignments is None:
+        return f"INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({key}) DO NOTHING"
+    assignments = re.sub(rf'\b{source}\.', 'excluded.', assignments)
+    return f"INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({key}) DO UPDATE SET {assignments}"
+
+
+def _statements(sql, params):
+    """Split a T-SQL batch into (statement, its parameters)"""
+    params = list(params)
+    for statement in sql.split(';'):
+        if not statement.strip() or _NOCOUNT.match(statement):
+            continue
+        count = statement.count('?')
+        yield statement, params[:count]
+        params = params[count:]
+
+
+def _translate(sql, params=()):
+    sql = _MERGE.sub(_merge_to_upsert, sql)
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    if _TOP.search(sql):
+        sql = _TOP.sub('SELECT', sql, count=1) + ' LIMIT ?'
+        params = tuple(params[1:]) + tuple(params[:1])
+    return sql, params
+
+
+def _sleep(seconds):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+class Cursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection._conn.cursor()
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        # pyodbc accepts parameters as one sequence or as separate arguments
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        _sleep(_settings['query_latency'])
+        try:
+            for statement, statement_params in _statements(sql, params):
+                self._cursor.execute(*_translate(statement, statement_params))
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        _sleep(_settings['query_latency'])
+        try:
+            self._cursor.executemany(_translate(sql)[0], seq_of_params)
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path):
+        # Pooled connections move between threads, as they do with pyodbc
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.timeout = 0
+        self.autocommit = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(connection_string='', timeout=0, **kwargs):
+    _sleep(_settings['connect_latency'])
+    path = _settings['database']
+    with _init_lock:
+        if path not in _initialized:
+            with sqlite3.connect(path) as conn:
+                conn.executescript(SCHEMA)
+            _initialized.add(path)
+    return Connection(path)
+
+
+def configure(connect_latency=None, query_latency=None, database=None):
+    """Change injected latency (seconds) or the backing SQLite file at runtime"""
+    if connect_latency is not None:
+        _settings['connect_latency'] = connect_latency
+    if query_latency is not None:
+        _settings['query_latency'] = query_latency
+    if database is not None:
+        _settings['database'] = database
+
+
+def submission_count():
+    with sqlite3.connect(_settings['database']) as conn:
+        return conn.execute("SELECT COUNT(*) FROM contact_submissions").fetchone()[0]
+
+
+def install():
+    """Make `import pyodbc` return this module"""
+    sys.modules['pyodbc'] = sys.modules[__name__]
@@ -0,0 +1,96 @@
+# Building registry and cached building pages
+# Every building page (and the home page) is rendered from templates/building.html
+# using this registry, so adding a building is one entry in BUILDINGS.
+import hashlib
+from collections import namedtuple
+from flask import Response, request
+from map_tiles import map_url, MAP_DISPLAY_SIZE
+import metrics
+
+# rect is the image-map rectangle on the map as pages show it, MAP_DISPLAY_SIZE pixels: (x1, y1, x2, y2)
+Building = namedtuple('Building', ['code', 'name', 'rect', 'events'])
+
+# Order matters: the first matching image-map area wins where rectangles overlap
+BUILDINGS = [
+    Building('MK', 'MK Building', (200, 300, 450, 400), ()),
+    Building('MC', 'MC Building', (300, 500, 550, 600), ()),
+    Building('MB', 'MB Building', (450, 630, 600, 700), ()),
+    Building('MI', 'MI Building', (500, 750, 650, 900), ()),
+    Building('MD', 'MD Building', (100, 500, 350, 850), ()),
+    Building('MA', 'MA Building', (150, 850, 400, 1000), ()),
+    Building('MG', 'MG Building', (400, 900, 800, 1250), ()),
+]
+
+HOME = 'Home'
+PAGE_MAX_AGE = 300
+
+
+def registry_version():
+    """Content hash of the registry; any change to BUILDINGS gives a new version"""
+    return hashlib.sha1(repr(BUILDINGS).encode('utf-8')).hexdigest()[:12]
+
+
+# BUILDINGS is fixed once the module is loaded, so the version is computed once
+REGISTRY_VERSION = registry_version()
+
+
+def get_building(code):
+    for building in BUILDINGS:
+        if building.code == code:
+            return building
+    return None
+
+
+class BuildingPages:
+    """Renders building pages once and serves them from memory"""
+
+    def __init__(self, app):
+        self._app = app
+        self._pages = {}  # (registry version, code) -> (body, etag)
+
+    def _render(self, code):
+        if code == HOME:
+            context = {'title': 'OpendaysMaps', 'heading': 'Home', 'code': None,
+                       'events_title': 'Main Events', 'events': ()}
+        else:
+            building = get_building(code)
+            if building is None:
+                return None
+            context = {'title': building.name, 'heading': building.code, 'code': building.code,
+                       'events_title': f'{building.code} Events', 'events': building.events}
+        template = self._app.jinja_env.get_template('building.html')
+        with metrics.timed('template_render'):
+            body = template.render(buildings=BUILDINGS, map_src=map_url(), map_size=MAP_DISPLAY_SIZE,
+                                   **context).encode('utf-8')
+        # The registry version leads the ETag, so a registry edit never revalidates an old page
+        return body, f'{REGISTRY_VERSION}-{hashlib.sha1(body).hexdigest()[:16]}'
+
+    def get(self, code):
+        """(body, etag) for a building code or HOME, or None if unknown"""
+        key = (REGISTRY_VERSION, code)
+        page = self._pages.get(key)
+        if page is None:
+            page = self._render(code)
+            if page is not None:
+                self._pages[key] = page
+        return page
+
+    def serve(self, code, private=False):
+        """Conditional response for the page, or None if the code is unknown
+
+        private is for pages behind the login: browsers revalidate them on every visit and
+        shared caches never store them, so the login check runs on each request
+        """
+        page = self.get(code)
+        if page is None:
+            return None
+        body, etag = page
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        if private:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = PAGE_MAX_AGE
+        return response.make_conditional(request)
@@ -0,0 +1,147 @@
+# Spatial index and hit-test API for the campus map
+# Building rectangles from the registry are normalized and bucketed into a
+# uniform grid once at startup, so a hit test only checks the few buildings
+# that share the point's grid cell. Points are in the pixels of the map as
+# pages show it (MAP_DISPLAY_SIZE), not of the source image; every response
+# names that size so clients can scale their own coordinates.
+import math
+from flask import Blueprint, request, jsonify
+from buildings import BUILDINGS
+from map_tiles import MAP_DISPLAY_SIZE
+
+GRID_CELL_SIZE = 50  # display pixels per grid cell
+MAX_BATCH_POINTS = 1000
+
+
+def normalize_rect(rect):
+    """Return (left, top, right, bottom) whatever order the corners were given in"""
+    x1, y1, x2, y2 = rect
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def _distance(rect, x, y):
+    """Euclidean distance from the point to the rectangle (0 inside it)"""
+    left, top, right, bottom = rect
+    dx = max(left - x, 0, x - right)
+    dy = max(top - y, 0, y - bottom)
+    return math.hypot(dx, dy)
+
+
+class CampusIndex:
+    """Uniform-grid index over building rectangles"""
+
+    def __init__(self, buildings, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        # (priority, code, rect); priority is registry order, which the image map also uses
+        self.entries = [(i, b.code, normalize_rect(b.rect)) for i, b in enumerate(buildings)]
+        self.grid = {}
+        for entry in self.entries:
+            left, top, right, bottom = entry[2]
+            for cx in range(int(left // cell_size), int(right // cell_size) + 1):
+                for cy in range(int(top // cell_size), int(bottom // cell_size) + 1):
+                    self.grid.setdefault((cx, cy), []).append(entry)
+        if self.grid:
+            xs = [cx for cx, _ in self.grid]
+            ys = [cy for _, cy in self.grid]
+            self._bounds = (min(xs), min(ys), max(xs), max(ys))
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def locate_all(self, x, y):
+        """Codes of every building containing the point, highest priority first"""
+        return [code for _, code, rect in self.grid.get(self._cell(x, y), ())
+                if rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]]
+
+    def locate(self, x, y):
+        """Code of the building at the point, or None"""
+        for _, code, rect in self.grid.get(self._cell(x, y), ()):
+            if rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]:
+                return code
+        return None
+
+    def nearest(self, x, y):
+        """(code, distance) of the closest building, searching outward ring by ring"""
+        if not self.entries:
+            return None, None
+        cx, cy = self._cell(x, y)
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        if not (min_cx <= cx <= max_cx and min_cy <= cy <= max_cy):
+            # Far outside the map a ring search would walk mostly empty cells
+            best = min((_distance(rect, x, y), priority, code) for priority, code, rect in self.entries)
+            return best[2], round(best[0], 2)
+
+        max_ring = max(abs(cx - min_cx), abs(cx - max_cx), abs(cy - min_cy), abs(cy - max_cy))
+
+        best = None
+        for ring in range(max_ring + 1):
+            # Anything in a farther ring is at least (ring - 1) cells away
+            if best is not None and best[0] <= (ring - 1) * self.cell_size:
+                break
+            for entry in self._ring_entries(cx, cy, ring):
+                candidate = (_distance(entry[2], x, y), entry[0], entry[1])
+                if best is None or candidate < best:
+                    best = candidate
+        return best[2], round(best[0], 2)
+
+    def _ring_entries(self, cx, cy, ring):
+        if ring == 0:
+            yield from self.grid.get((cx, cy), ())
+            return
+        for dx in range(-ring, ring + 1):
+            for dy in (-ring, ring) if abs(dx) != ring else range(-ring, ring + 1):
+                yield from self.grid.get((cx + dx, cy + dy), ())
+
+
+# Built once at import; the registry is static for the life of the process
+campus_index = CampusIndex(BUILDINGS)
+
+map_api = Blueprint('map_api', __name__)
+
+
+def _to_point(x, y):
+    x, y = float(x), float(y)
+    if not (math.isfinite(x) and math.isfinite(y)):
+        raise ValueError("coordinates must be finite")
+    return x, y
+
+
+def _point_args():
+    try:
+        return _to_point(request.args['x'], request.args['y'])
+    except (KeyError, ValueError):
+        return None
+
+
+@map_api.route('/api/locate')
+def locate():
+    point = _point_args()
+    if point is None:
+        return jsonify({'error': 'x and y must be numbers'}), 400
+    matches = campus_index.locate_all(*point)
+    return jsonify({'building': matches[0] if matches else None, 'matches': matches, 'map_size': MAP_DISPLAY_SIZE})
+
+
+@map_api.route('/api/nearest')
+def nearest():
+    point = _point_args()
+    if point is None:
+        return jsonify({'error': 'x and y must be numbers'}), 400
+    code, distance = campus_index.nearest(*point)
+    return jsonify({'building': code, 'distance': distance, 'map_size': MAP_DISPLAY_SIZE})
+
+
+@map_api.route('/api/locate/batch', methods=['POST'])
+def locate_batch():
+    """Resolve many points at once: {"points": [[x, y], ...]}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'body must be a JSON object with a points list'}), 400
+    points = data.get('points')
+    if not isinstance(points, list) or len(points) > MAX_BATCH_POINTS:
+        return jsonify({'error': f'points must be a list of at most {MAX_BATCH_POINTS} [x, y] pairs'}), 400
+    try:
+        results = [campus_index.locate(*_to_point(x, y)) for x, y in points]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'each point must be an [x, y] pair of numbers'}), 400
+    return jsonify({'results': results, 'map_size': MAP_DISPLAY_SIZE})
@@ -0,0 +1,122 @@
+# Bounded executor for SQL Server calls
+# Database work runs on its own small thread pool instead of the request thread.
+# Callers wait at most DB_CALL_TIMEOUT and get DatabaseBusy when SQL Server is slow
+# or the executor is saturated, so a stalled database cannot tie up the threads
+# serving login and map pages.
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from db_pool import POOL_SIZE
+import submission_store
+
+logger = logging.getLogger(__name__)
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(POOL_SIZE)))
+DB_EXECUTOR_QUEUE_DEPTH = int(os.getenv("DB_EXECUTOR_QUEUE_DEPTH", "10"))  # calls waiting beyond the workers
+DB_CALL_TIMEOUT = float(os.getenv("DB_CALL_TIMEOUT", "3"))  # seconds a request waits for a database call
+LATENCY_SAMPLES = 1000
+
+
+class DatabaseBusy(Exception):
+    """Raised when the executor is saturated or a call does not finish in time"""
+
+
+class DatabaseTimeout(DatabaseBusy):
+    """Raised when a database call exceeds its timeout
+
+    pending is the call's future when it had already started and could not be cancelled:
+    its outcome is unknown until the future resolves
+    """
+
+    pending = None
+
+
+class DatabaseExecutor:
+    def __init__(self, workers=DB_EXECUTOR_WORKERS, queue_depth=DB_EXECUTOR_QUEUE_DEPTH, timeout=DB_CALL_TIMEOUT):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + queue_depth
+        self.timeout = timeout
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self):
+        # Forked workers must not reuse the parent's threads
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='db-executor')
+                    self._executor_pid = os.getpid()
+                    self._in_flight = 0
+        return self._executor
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def call(self, fn, *args, timeout=None):
+        """Run fn(*args) on the executor and return its result within timeout seconds"""
+        executor = self._get_executor()
+        with self._lock:
+            # A timed-out call keeps its slot until it really finishes, so stuck calls
+            # fill the executor and further requests fail fast instead of queueing
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise DatabaseBusy("Database executor is saturated")
+            self._in_flight += 1
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(self._finished)
+
+        start = time.perf_counter()
+        try:
+            result = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeout:
+            cancelled = future.cancel()  # drops the call if it has not started yet
+            with self._lock:
+                self.timeouts += 1
+            logger.warning(f"Database call {getattr(fn, '__name__', fn)} timed out")
+            error = DatabaseTimeout("Database call timed out")
+            if not cancelled:
+                error.pending = future  # still running, and may yet commit
+            raise error from None
+        finally:
+            self._latencies.append(time.perf_counter() - start)
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self):
+        ordered = sorted(self._latencies)
+        with self._lock:
+            result = {'workers': self.workers, 'capacity': self.capacity, 'in_flight': self._in_flight,
+                      'completed': self.completed, 'rejected': self.rejected, 'timeouts': self.timeouts,
+                      'samples': len(ordered)}
+        for pct in (50, 90, 99):
+            result[f'p{pct}_ms'] = round(ordered[min(len(ordered) - 1, len(ordered) * pct // 100)] * 1000, 2) if ordered else None
+        return result
+
+
+def insert_submission(name, student_id, email, subject, details, ip_address):
+    """Insert one contact submission; runs on an executor thread"""
+    # Let the driver abandon a statement the caller has already given up on
+    submission_store.save(submission_store.SubmissionRow(name, student_id, email, subject, details, None, ip_address),
+                          timeout=max(1, math.ceil(DB_CALL_TIMEOUT)))
+
+
+_executor = DatabaseExecutor()
+call = _executor.call
+stats = _executor.stats
@@ -0,0 +1,248 @@
+# Shared connection pool for the SQL Server contact database
+import os
+import time
+import logging
+import threading
+import atexit
+from collections import deque
+from contextlib import contextmanager
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration from environment variables
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+POOL_MAX_AGE = float(os.getenv("DB_POOL_MAX_AGE", "1800"))  # recycle connections older than this
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "0"))  # ping if idle longer than this
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))  # login timeout for new connections
+
+
+def driver():
+    """The pyodbc module, imported on first use so processes that never reach SQL Server skip loading it"""
+    import pyodbc
+    return pyodbc
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+def build_connection_string(server, database, username='', password='', trusted_connection='yes'):
+    """Build the ODBC connection string used by both apps"""
+    if trusted_connection.lower() == "yes":
+        return f'DRIVER={{SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;'
+    return f'DRIVER={{SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password};'
+
+
+class _PooledConnection:
+    """A raw connection plus the timestamps the pool needs"""
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Bounded pool with validate-on-checkout, max-age recycling and checkout timeouts"""
+
+    def __init__(self, connect, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 max_age=POOL_MAX_AGE, ping_after=POOL_PING_AFTER):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ping_after = ping_after
+
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._open = 0  # idle + in use
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        # Counters reported by stats()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _checkout(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            entry = None
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()  # most recently used first
+                    break
+                if self._open < self.size:
+                    self._open += 1  # reserve a slot, connect outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_use += 1
+            waited = time.monotonic() - start
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            if entry is not None:
+                entry = self._validate(entry)
+            if entry is None:
+                with metrics.timed('sql_connect'):
+                    entry = _PooledConnection(self._connect())
+                with self._cond:
+                    self._created += 1
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return entry
+
+    def _validate(self, entry):
+        """Return the entry if it is still usable, otherwise close it and return None"""
+        now = time.monotonic()
+        if now - entry.created_at > self.max_age:
+            self._close_quietly(entry.conn)
+            with self._cond:
+                self._recycled += 1
+            return None
+
+        if now - entry.last_used >= self.ping_after:
+            try:
+                entry.conn.cursor().execute("SELECT 1").fetchone()
+            except driver().Error as e:
+                logger.warning(f"Discarding broken pooled connection: {e}")
+                self._close_quietly(entry.conn)
+                with self._cond:
+                    self._ping_failures += 1
+                return None
+        return entry
+
+    def _release(self, entry, discard=False):
+        if discard or self._closed:
+            self._close_quietly(entry.conn)
+        else:
+            entry.last_used = time.monotonic()
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._open -= 1
+            else:
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the duration of a with block"""
+        entry = self._checkout()
+        try:
+            yield entry.conn
+        except BaseException:
+            # Roll back the failed unit of work (or one abandoned by a closed generator);
+            # drop the connection if even that fails, however it fails
+            rolled_back = False
+            try:
+                entry.conn.rollback()
+                rolled_back = True
+            finally:
+                self._release(entry, discard=not rolled_back)
+            raise
+        else:
+            self._release(entry)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry.conn)
+
+    def stats(self):
+        """Snapshot of pool usage for monitoring"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'recycled': self._recycled,
+                'ping_failures': self._ping_failures,
+                'wait_time_total': round(self._wait_total, 6),
+                'wait_time_avg': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+                'wait_time_max': round(self._wait_max, 6),
+            }
+
+
+# Process-wide pool shared by main.py and app.py
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared pool, creating it from environment variables on first use"""
+    global _pool, _pool_pid
+    # A forked worker must not share the parent's ODBC connections; it opens its own
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                conn_str = build_connection_string(
+                    os.getenv("DB_SERVER", "ALI\\SQLEXPRESS"),
+                    os.getenv("DB_NAME", "Wlv"),
+                    os.getenv("DB_USERNAME", ""),
+                    os.getenv("DB_PASSWORD", ""),
+                    os.getenv("TRUSTED_CONNECTION", "yes"),
+                )
+                _pool = ConnectionPool(lambda: driver().connect(conn_str, timeout=CONNECT_TIMEOUT))
+                _pool_pid = os.getpid()
+                atexit.register(_pool.close)
+                logger.info(f"SQL Server connection pool created (size={_pool.size})")
+    return _pool
+
+
+def _pool_connections():
+    if _pool is None:
+        return {}
+    usage = _pool.stats()
+    return {('in_use',): usage['in_use'], ('idle',): usage['idle'], ('waiting',): usage['waiting']}
+
+
+metrics.register_callback('sql_pool_connections', 'SQL Server pool connections by state', 'gauge', ('state',),
+                          _pool_connections)
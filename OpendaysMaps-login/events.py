@@ -0,0 +1,288 @@
+# Per-building events store with fast "now / next / overlapping" queries
+# Events live in SQLite; each process keeps an in-memory index per building
+# (events sorted by start time plus the longest duration), which answers
+# overlap queries with a bisect instead of a scan. The index reloads when
+# another process changes the database.
+import os
+import json
+import bisect
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from collections import namedtuple, OrderedDict
+from flask import Blueprint, Response, request, jsonify, session
+from buildings import get_building
+from auth import is_staff
+
+logger = logging.getLogger(__name__)
+
+EVENTS_DATABASE = os.getenv("EVENTS_DATABASE", "events.db")
+EVENTS_MAX_AGE = 30  # seconds browsers may reuse an events response
+MAX_NEXT_EVENTS = 50
+RESPONSE_CACHE_SIZE = 512
+
+Event = namedtuple('Event', ['id', 'building', 'room', 'title', 'start', 'end'])
+
+
+def _row_to_event(row):
+    return Event(row[0], row[1], row[2], row[3], datetime.fromisoformat(row[4]), datetime.fromisoformat(row[5]))
+
+
+class EventClash(Exception):
+    """Raised when a new event overlaps another event in the same room"""
+
+    def __init__(self, existing):
+        super().__init__(f"Clashes with '{existing.title}' in {existing.room} "
+                         f"({existing.start:%H:%M}-{existing.end:%H:%M})")
+        self.existing = existing
+
+
+class BuildingIndex:
+    """Events of one building sorted by start, with the longest duration for overlap bounds"""
+
+    def __init__(self, events):
+        self.events = sorted(events, key=lambda e: (e.start, e.end, e.id))
+        self.starts = [e.start for e in self.events]
+        self.max_duration = max((e.end - e.start for e in self.events), default=timedelta(0))
+
+    def overlapping(self, start, end):
+        """Events with start < end and end > start"""
+        # No event starting before (start - max_duration) can still be running at start
+        lo = bisect.bisect_left(self.starts, start - self.max_duration)
+        hi = bisect.bisect_left(self.starts, end)
+        return [e for e in self.events[lo:hi] if e.end > start]
+
+    def at(self, moment):
+        return self.overlapping(moment, moment + timedelta(microseconds=1))
+
+    def upcoming(self, moment, count):
+        lo = bisect.bisect_right(self.starts, moment)
+        return self.events[lo:lo + count]
+
+
+class EventStore:
+    def __init__(self, path=EVENTS_DATABASE):
+        self._path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._indexes = {}
+        self._watch_conn = None
+        self._watch_pid = None
+        self._data_version = None
+        self.version = 0  # bumped whenever the index is rebuilt
+
+    def stats(self):
+        return {'events': sum(len(index.events) for index in self._indexes.values()), 'index_version': self.version}
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    building TEXT NOT NULL,
+                    room TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    starts_at TEXT NOT NULL,
+                    ends_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_room ON events (building, room, starts_at)")
+            self._local.conn = conn
+        return conn
+
+    def refresh(self):
+        """Rebuild the in-memory index if any connection has changed the database"""
+        with self._lock:
+            if self._watch_conn is None or self._watch_pid != os.getpid():
+                self._connect()  # make sure the table exists
+                self._watch_conn = sqlite3.connect(self._path, timeout=5, check_same_thread=False)
+                self._watch_pid = os.getpid()  # a forked worker opens its own
+            # data_version changes whenever another connection commits, in this process or not
+            data_version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            by_building = {}
+            for row in self._watch_conn.execute("SELECT id, building, room, title, starts_at, ends_at FROM events"):
+                event = _row_to_event(row)
+                by_building.setdefault(event.building, []).append(event)
+            self._indexes = {code: BuildingIndex(events) for code, events in by_building.items()}
+            self._data_version = data_version
+            self.version += 1
+
+    def _index(self, building):
+        self.refresh()
+        return self._indexes.get(building) or BuildingIndex(())
+
+    def happening_now(self, building, moment=None):
+        return self._index(building).at(moment or datetime.now())
+
+    def next_events(self, building, count=5, moment=None):
+        return self._index(building).upcoming(moment or datetime.now(), count)
+
+    def overlapping(self, building, start, end):
+        return self._index(building).overlapping(start, end)
+
+    def add_event(self, building, room, title, start, end):
+        """Insert an event; raises EventClash if the room is already booked"""
+        if end <= start:
+            raise ValueError("An event must end after it starts")
+
+        # Cheap check against the local index first
+        for event in self.overlapping(building, start, end):
+            if event.room == room:
+                raise EventClash(event)
+
+        # Authoritative check inside a write transaction, in case another process got there first
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, building, room, title, starts_at, ends_at FROM events "
+                "WHERE building = ? AND room = ? AND starts_at < ? AND ends_at > ? LIMIT 1",
+                (building, room, end.isoformat(), start.isoformat())).fetchone()
+            if row is not None:
+                raise EventClash(_row_to_event(row))
+            event_id = conn.execute(
+                "INSERT INTO events (building, room, title, starts_at, ends_at) VALUES (?, ?, ?, ?, ?)",
+                (building, room, title, start.isoformat(), end.isoformat())).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Event {event_id} added to {building} {room}: {title}")
+        return Event(event_id, building, room, title, start, end)
+
+
+event_store = EventStore()
+
+
+def stats():
+    return event_store.stats()
+
+
+def event_json(event):
+    return {'id': event.id, 'building': event.building, 'room': event.room, 'title': event.title,
+            'start': event.start.isoformat(timespec='minutes'), 'end': event.end.isoformat(timespec='minutes')}
+
+
+class _ResponseCache:
+    """Small LRU of encoded JSON bodies keyed by query and store version"""
+
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self._size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                return item
+        body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+        item = (body, hashlib.sha1(body).hexdigest())
+        with self._lock:
+            self._items[key] = item
+            if len(self._items) > self._size:
+                self._items.popitem(last=False)
+        return item
+
+
+_responses = _ResponseCache()
+
+events_api = Blueprint('events_api', __name__)
+
+
+def _cached_json(key, build):
+    body, etag = _responses.get_or_build((event_store.version,) + key, build)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = EVENTS_MAX_AGE
+    return response.make_conditional(request)
+
+
+def _parse_time(value):
+    """Local ISO 8601 date-time; events are stored without a time zone"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        raise ValueError("times must be local, without a UTC offset")
+    return moment
+
+
+def _error(message, status=400):
+    return jsonify({'error': message}), status
+
+
+@events_api.route('/api/buildings/<code>/events/now')
+def events_now(code):
+    if get_building(code) is None:
+        return _error('Unknown building', 404)
+    event_store.refresh()
+    # "Now" is resolved to the minute so pollers within the same minute share one cached body
+    moment = datetime.now().replace(second=0, microsecond=0)
+    return _cached_json(('now', code, moment), lambda: {
+        'building': code, 'at': moment.isoformat(timespec='minutes'),
+        'events': [event_json(e) for e in event_store.happening_now(code, moment)]})
+
+
+@events_api.route('/api/buildings/<code>/events/next')
+def events_next(code):
+    if get_building(code) is None:
+        return _error('Unknown building', 404)
+    count = request.args.get('n', 5, type=int)
+    if not 1 <= count <= MAX_NEXT_EVENTS:
+        return _error(f'n must be between 1 and {MAX_NEXT_EVENTS}')
+    event_store.refresh()
+    moment = datetime.now().replace(second=0, microsecond=0)
+    return _cached_json(('next', code, moment, count), lambda: {
+        'building': code, 'after': moment.isoformat(timespec='minutes'),
+        'events': [event_json(e) for e in event_store.next_events(code, count, moment)]})
+
+
+@events_api.route('/api/buildings/<code>/events')
+def events_overlapping(code):
+    """Events overlapping ?start=...&end=... (ISO 8601 local times)"""
+    if get_building(code) is None:
+        return _error('Unknown building', 404)
+    try:
+        start = _parse_time(request.args['start'])
+        end = _parse_time(request.args['end'])
+    except (KeyError, ValueError):
+        return _error('start and end must be ISO 8601 date-times')
+    event_store.refresh()
+    return _cached_json(('slot', code, start, end), lambda: {
+        'building': code, 'start': start.isoformat(timespec='minutes'), 'end': end.isoformat(timespec='minutes'),
+        'events': [event_json(e) for e in event_store.overlapping(code, start, end)]})
+
+
+@events_api.route('/api/buildings/<code>/events', methods=['POST'])
+def create_event(code):
+    """Add an event (staff only): {"room": ..., "title": ..., "start": ..., "end": ...}"""
+    if 'user_id' not in session:
+        return _error('Login required', 401)
+    if not is_staff():
+        return _error('Staff only', 403)
+    if get_building(code) is None:
+        return _error('Unknown building', 404)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _error('body must be a JSON object')
+    room = str(data.get('room', '')).strip()
+    title = str(data.get('title', '')).strip()
+    if not room or not title or len(room) > 50 or len(title) > 200:
+        return _error('room and title are required')
+    try:
+        start = _parse_time(data['start'])
+        end = _parse_time(data['end'])
+        event = event_store.add_event(code, room, title, start, end)
+    except (KeyError, TypeError, ValueError):
+        return _error('start and end must be ISO 8601 date-times, with end after start')
+    except EventClash as e:
+        return jsonify({'error': str(e), 'clash': event_json(e.existing)}), 409
+    return jsonify(event_json(event)), 201
@@ -0,0 +1,251 @@
+# Queue-based logging shared by both apps
+# Request threads only put records on a bounded in-memory queue. A background
+# QueueListener formats them (JSON lines by default) and writes them to a
+# rotating log file, so disk I/O never happens on the request path. When the
+# queue is full, records are dropped and counted instead of blocking. Under
+# serve.py only the master writes the file: each worker's listener forwards its
+# records to the master over a local socket, so rotation happens in one process.
+import os
+import re
+import copy
+import json
+import queue
+import pickle
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # 'json' or 'text'
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")  # e.g. 'midnight' for time-based rotation instead of size
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1"))  # share of successful requests logged
+FORWARD_TIMEOUT = 5  # seconds a worker waits for room in the master's socket buffer before dropping a record
+FORWARD_MAX_CHARS = 8000  # longer messages and tracebacks are cut so a record fits one datagram
+RECEIVE_BUFFER = 262144
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+_ANSI = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': _ANSI.sub('', record.getMessage()).rstrip(),
+            'thread': record.threadName,
+            'process': record.process,
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class AccessLogSampler(logging.Filter):
+    """Keeps a sample of werkzeug access lines for successful requests, and every error"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if record.name != 'werkzeug' or self.rate >= 1:
+            return True
+        # werkzeug logs requests as ('"GET / HTTP/1.1"', status, size)
+        args = record.args if isinstance(record.args, tuple) else ()
+        try:
+            status = int(args[1])
+        except (IndexError, TypeError, ValueError):
+            return True
+        if status >= 400 or random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, leave the formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ForwardingHandler(logging.Handler):
+    """Sends records to the process that writes the log file, one datagram per record"""
+
+    def __init__(self, sock):
+        super().__init__()
+        self.sock = sock
+        self.dropped = 0
+
+    def emit(self, record):
+        # Any failure, such as an unpicklable extra attribute, must not stop the listener thread
+        try:
+            fields = dict(record.__dict__, msg=record.getMessage(), args=None, exc_info=None)
+            if len(fields['msg']) > FORWARD_MAX_CHARS:
+                fields['msg'] = fields['msg'][:FORWARD_MAX_CHARS] + ' [truncated]'
+            if fields.get('exc_text') and len(fields['exc_text']) > FORWARD_MAX_CHARS:
+                fields['exc_text'] = '[truncated] ' + fields['exc_text'][-FORWARD_MAX_CHARS:]
+            self.sock.send(pickle.dumps(fields))
+        except OSError:
+            self.dropped += 1  # the master's socket stayed full, or the master is gone
+        except Exception:
+            self.dropped += 1
+            self.handleError(record)
+
+
+_listener = None
+_handler = None
+_sampler = None
+_forwarder = None
+_receiver = None
+_setup_lock = threading.Lock()
+
+
+def _file_handler(filename):
+    if LOG_ROTATE_WHEN:
+        handler = TimedRotatingFileHandler(filename, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT,
+                                           encoding='utf-8', delay=True)
+    else:
+        handler = RotatingFileHandler(filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                      encoding='utf-8', delay=True)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def setup_logging(filename=LOG_FILE):
+    """Route the root logger through the queue; safe to call more than once"""
+    global _listener, _handler, _sampler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _sampler = AccessLogSampler(ACCESS_LOG_SAMPLE_RATE)
+        _handler = DroppingQueueHandler(log_queue)
+        _handler.addFilter(_sampler)
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_handler)
+
+        _listener = QueueListener(log_queue, _file_handler(filename), respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _restart_in_child():
+    """The listener thread does not survive fork, so a forked worker starts its own"""
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def forward_to(sock):
+    """In a worker: send records to the master (see receive_from) instead of writing the file"""
+    global _forwarder
+    if _listener is None:
+        return
+    sock.settimeout(FORWARD_TIMEOUT)
+    _forwarder = ForwardingHandler(sock)
+    inherited, _listener.handlers = _listener.handlers, (_forwarder,)
+    for handler in inherited:
+        handler.close()  # the master's file, open in this process since the fork
+
+
+def receive_from(reader, writer):
+    """In the master: write the records workers forward on reader with this process's file handler"""
+    global _receiver
+    if _listener is None:
+        return
+    handlers = _listener.handlers
+
+    def receive():
+        while True:
+            try:
+                data = reader.recv(RECEIVE_BUFFER)
+            except OSError:
+                return
+            if not data:
+                return  # stop_receiving()
+            try:
+                record = logging.makeLogRecord(pickle.loads(data))
+            except Exception:
+                continue
+            for handler in handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    _receiver = (threading.Thread(target=receive, name='log-receiver', daemon=True), writer)
+    _receiver[0].start()
+
+
+def stop_receiving(timeout=5):
+    """Write out the records forwarded so far; later ones wait in the socket for the next receiver"""
+    global _receiver
+    if _receiver is None:
+        return
+    thread, writer = _receiver
+    _receiver = None
+    try:
+        writer.send(b'')  # queued behind every record sent before it
+    except OSError:
+        return
+    thread.join(timeout)
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def stats():
+    if _listener is None:
+        return {'enabled': False}
+    return {
+        'enabled': True,
+        'forwarded': _forwarder is not None,
+        'forward_dropped': _forwarder.dropped if _forwarder is not None else 0,
+        'queued': _listener.queue.qsize(),
+        'max_queue': LOG_QUEUE_SIZE,
+        'dropped': _handler.dropped,
+        'access_sampled_out': _sampler.sampled_out,
+        'access_sample_rate': ACCESS_LOG_SAMPLE_RATE,
+    }
@@ -0,0 +1,223 @@
+# Scaled variants and a tile pyramid for the campus map image
+# Images are generated lazily on first request into an on-disk cache. URLs
+# carry a version derived from the source file, so they can be cached forever.
+import os
+import io
+import math
+import hashlib
+import logging
+import threading
+from flask import Blueprint, request, send_file, jsonify, url_for, abort
+
+try:
+    from PIL import Image  # optional; without Pillow the original map is served as-is
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+MAP_SOURCE_CANDIDATES = ('MAP.png', 'map.png', os.path.join('static', 'MAP.png'))
+MAP_SOURCE = os.getenv("MAP_SOURCE", "")
+MAP_CACHE_DIR = os.getenv("MAP_CACHE_DIR", "map_cache")
+MAP_WIDTHS = (200, 400, 800, 1600)
+# Size pages show the map at; building rectangles and the /api/locate coordinates use these pixels
+MAP_DISPLAY_SIZE = (800, 1403)
+TILE_SIZE = 256
+IMMUTABLE_MAX_AGE = 31536000  # one year
+FORMATS = {'webp': 'image/webp', 'png': 'image/png'}
+
+
+class MapImages:
+    """Lazily generated map variants and tiles for one source image"""
+
+    def __init__(self, source, cache_dir=MAP_CACHE_DIR):
+        self.source = source
+        self.cache_dir = cache_dir
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._image = None
+
+        st = os.stat(source)
+        self.version = hashlib.sha1(f"{os.path.abspath(source)}:{st.st_mtime_ns}:{st.st_size}".encode()).hexdigest()[:10]
+        with Image.open(source) as im:
+            self.width, self.height = im.size
+        self.max_zoom = max(0, math.ceil(math.log2(max(self.width, self.height) / TILE_SIZE)))
+        # Only these widths are generated, so the cache stays bounded
+        self.widths = sorted({w for w in MAP_WIDTHS if w < self.width} | {self.width})
+
+    def closest_width(self, width):
+        """Smallest available width at least as wide as requested"""
+        for available in self.widths:
+            if available >= width:
+                return available
+        return self.width
+
+    def _source_image(self):
+        if self._image is None:
+            with Image.open(self.source) as im:
+                self._image = im.convert('RGBA')
+        return self._image
+
+    def _lock_for(self, path):
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _cached(self, relative_path, build):
+        """Path of a cached file, building it with build() the first time"""
+        path = os.path.join(self.cache_dir, self.version, relative_path)
+        if os.path.exists(path):
+            return path
+        with self._lock_for(path):
+            if not os.path.exists(path):  # another thread may have built it meanwhile
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                data = build()
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def _encode(image, fmt):
+        # A 256-colour palette is plenty for a flat-coloured map and keeps edges sharp;
+        # lossless WebP of the palettized image beats lossy WebP on size here
+        palette = image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        buffer = io.BytesIO()
+        if fmt == 'webp':
+            palette.convert('RGBA').save(buffer, 'WEBP', lossless=True, method=6)
+        else:
+            palette.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue()
+
+    def variant(self, width, fmt):
+        """Map scaled to one of the available widths, or None"""
+        if width not in self.widths:
+            return None
+
+        def build():
+            image = self._source_image()
+            if width != self.width:
+                height = round(self.height * width / self.width)
+                image = image.resize((width, height), Image.LANCZOS)
+            return self._encode(image, fmt)
+        return self._cached(os.path.join('full', f"{width}.{fmt}"), build)
+
+    def tile(self, z, x, y, fmt):
+        """TILE_SIZE square tile; zoom max_zoom is full resolution, each level below halves it"""
+        if not 0 <= z <= self.max_zoom:
+            return None
+        scale = 2 ** (z - self.max_zoom)
+        level_w, level_h = max(1, round(self.width * scale)), max(1, round(self.height * scale))
+        if not (0 <= x < math.ceil(level_w / TILE_SIZE) and 0 <= y < math.ceil(level_h / TILE_SIZE)):
+            return None
+
+        def build():
+            image = self._source_image()
+            if scale != 1:
+                image = image.resize((level_w, level_h), Image.LANCZOS)
+            box = (x * TILE_SIZE, y * TILE_SIZE,
+                   min((x + 1) * TILE_SIZE, level_w), min((y + 1) * TILE_SIZE, level_h))
+            return self._encode(image.crop(box), fmt)
+        return self._cached(os.path.join('tiles', str(z), str(x), f"{y}.{fmt}"), build)
+
+
+def _find_source():
+    for candidate in ((MAP_SOURCE,) if MAP_SOURCE else MAP_SOURCE_CANDIDATES):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+_images = None
+_images_lock = threading.Lock()
+
+
+def get_map_images():
+    """Shared MapImages, or None if Pillow or the source image is missing"""
+    global _images
+    if _images is None and Image is not None:
+        with _images_lock:
+            if _images is None:
+                source = _find_source()
+                if source is not None:
+                    _images = MapImages(source)
+                    logger.info(f"Map variants from {source} (version {_images.version})")
+    return _images
+
+
+def map_url(width=MAP_DISPLAY_SIZE[0]):
+    """URL for the page map image; falls back to the original file without Pillow"""
+    images = get_map_images()
+    if images is None:
+        return 'MAP.png'
+    return url_for('map_tiles.map_variant', version=images.version, width=images.closest_width(width))
+
+
+map_tiles = Blueprint('map_tiles', __name__)
+
+
+def _immutable(response):
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def _current_images(version):
+    images = get_map_images()
+    if images is None or version != images.version:
+        abort(404)
+    return images
+
+
+@map_tiles.route('/map/<version>/<int:width>')
+def map_variant(version, width):
+    """Scaled map, WebP for browsers that accept it and PNG otherwise"""
+    images = _current_images(version)
+    fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'png'
+    path = images.variant(width, fmt)
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype=FORMATS[fmt], conditional=True)
+    response.vary.add('Accept')
+    return _immutable(response)
+
+
+@map_tiles.route('/map/<version>/<int:width>.<fmt>')
+def map_variant_format(version, width, fmt):
+    images = _current_images(version)
+    path = images.variant(width, fmt) if fmt in FORMATS else None
+    if path is None:
+        abort(404)
+    return _immutable(send_file(path, mimetype=FORMATS[fmt], conditional=True))
+
+
+@map_tiles.route('/tiles/<version>/<int:z>/<int:x>/<int:y>.<fmt>')
+def map_tile(version, z, x, y, fmt):
+    images = _current_images(version)
+    path = images.tile(z, x, y, fmt) if fmt in FORMATS else None
+    if path is None:
+        abort(404)
+    return _immutable(send_file(path, mimetype=FORMATS[fmt], conditional=True))
+
+
+@map_tiles.route('/map/tiles.json')
+def tiles_manifest():
+    """Describes the pyramid so a map client can build tile URLs"""
+    images = get_map_images()
+    if images is None:
+        abort(404)
+    return jsonify({
+        'version': images.version,
+        'width': images.width,
+        'height': images.height,
+        'display_width': MAP_DISPLAY_SIZE[0],  # hit-test coordinates are scaled by width / display_width
+        'display_height': MAP_DISPLAY_SIZE[1],
+        'tile_size': TILE_SIZE,
+        'min_zoom': 0,
+        'max_zoom': images.max_zoom,
+        'widths': images.widths,
+        'tiles': f"/tiles/{images.version}/{{z}}/{{x}}/{{y}}.{{format}}",
+        'formats': list(FORMATS),
+    })
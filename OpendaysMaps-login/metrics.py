@@ -0,0 +1,350 @@
+# Request and operation metrics in Prometheus text format
+# Histograms and counters are plain in-process structures behind a lock, so
+# recording a sample costs a bisect and a few additions. Values owned by other
+# modules (pool usage, rate limiter decisions) are read through callbacks only
+# when /metrics is scraped. With METRICS_DIR set (serve.py sets it for several
+# workers) each process also writes a snapshot of its values there every
+# METRICS_FLUSH_INTERVAL seconds, and /metrics sums the snapshots of every worker,
+# so each scrape describes the whole server whichever worker answers it.
+import os
+import json
+import time
+import bisect
+import logging
+import secrets
+import threading
+from flask import Blueprint, Response, request, g, abort, before_render_template, template_rendered
+
+logger = logging.getLogger(__name__)
+
+STATS_TOKEN = os.getenv("STATS_TOKEN", "")  # same token as /stats
+METRICS_DIR = os.getenv("METRICS_DIR", "")  # shared by the worker processes of one server
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # seconds between snapshots
+METRICS_PREFIX = 'opendays'
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+OPERATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+# File types reported separately for catch-all routes; anything else is grouped as "other"
+ROUTE_EXTENSIONS = {'.html', '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.webp'}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def reset(self):
+        """Forget every value; a forked worker starts counting from zero"""
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def snapshot(self):
+        """[(label values, value)]"""
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self, items):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.type}'
+        for labels, value in items:
+            yield f'{self.name}{_labels(self.labelnames, labels)} {value}'
+
+    def expose(self):
+        return self.render(self.snapshot())
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def snapshot(self):
+        """[(label values, [per-bucket counts, sum, count])]"""
+        with self._lock:
+            return [(labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items()]
+
+    def render(self, items):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, [le])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {count}'
+
+    def expose(self):
+        return self.render(self.snapshot())
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class CallbackMetric:
+    """Gauge or counter whose values are read from fn() at scrape time: {label values: value}"""
+
+    def __init__(self, name, help, type, labelnames, fn):
+        self.name, self.help, self.type, self.labelnames, self.fn = name, help, type, tuple(labelnames), fn
+
+    def reset(self):
+        pass  # the owning module's values are read afresh on every scrape
+
+    def snapshot(self):
+        return list(self.fn().items())
+
+    render = Counter.render
+
+    def expose(self):
+        return self.render(self.snapshot())
+
+
+request_duration = Histogram(f'{METRICS_PREFIX}_http_request_duration_seconds',
+                             'Request latency by route', ('route', 'method'))
+requests_total = Counter(f'{METRICS_PREFIX}_http_requests_total', 'Requests by route and status',
+                         ('route', 'method', 'status'))
+requests_in_flight = Gauge(f'{METRICS_PREFIX}_http_requests_in_flight', 'Requests being handled')
+operation_duration = Histogram(f'{METRICS_PREFIX}_operation_duration_seconds',
+                               'Time spent in internal operations', ('operation',), OPERATION_BUCKETS)
+
+_registry = [request_duration, requests_total, requests_in_flight, operation_duration]
+
+
+def timed(operation):
+    """Context manager recording an operation (sqlite_query, password_hash, sql_insert, ...)"""
+    return _Timer(operation_duration, (operation,))
+
+
+def observe(operation, seconds):
+    operation_duration.observe(seconds, operation)
+
+
+def register_callback(name, help, type, labelnames, fn):
+    _registry.append(CallbackMetric(f'{METRICS_PREFIX}_{name}', help, type, labelnames, fn))
+
+
+def _add(total, value):
+    if total is None:
+        return value
+    if isinstance(total, list):  # histogram series
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+    return total + value
+
+
+def write_snapshot():
+    """Write this process's values to METRICS_DIR, where the other workers' /metrics reads them"""
+    if not METRICS_DIR:
+        return
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({metric.name: metric.snapshot() for metric in _registry}, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def clear_snapshots():
+    """Remove the snapshots of an earlier server run"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(('.json', '.tmp')):
+            os.unlink(os.path.join(METRICS_DIR, name))
+
+
+def _read_snapshots():
+    """[(fresh, values)] for every process that has written a snapshot, including exited workers"""
+    snapshots = []
+    now = time.time()
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            fresh = now - os.path.getmtime(path) < 3 * METRICS_FLUSH_INTERVAL
+            with open(path) as f:
+                snapshots.append((fresh, json.load(f)))
+        except (OSError, ValueError):
+            continue  # replaced or removed while listing
+    return snapshots
+
+
+def _merged_exposition():
+    write_snapshot()
+    snapshots = _read_snapshots()
+    lines = []
+    for metric in _registry:
+        merged = {}
+        for fresh, values in snapshots:
+            # Counters of exited workers stay in the totals, so they never go backwards;
+            # gauges only count processes that are still writing snapshots
+            if metric.type == 'gauge' and not fresh:
+                continue
+            for labels, value in values.get(metric.name, ()):
+                labels = tuple(labels)
+                merged[labels] = _add(merged.get(labels), value)
+        lines.extend(metric.render(list(merged.items())))
+    return '\n'.join(lines) + '\n'
+
+
+def exposition():
+    if METRICS_DIR:
+        return _merged_exposition()
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            write_snapshot()
+        except Exception as e:
+            logger.warning(f"Could not write the metrics snapshot: {e}")
+
+
+def _start_flusher():
+    """One snapshot thread per worker process"""
+    global _flusher_pid
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flush_loop, name='metrics-snapshot', daemon=True).start()
+
+
+def _reset_in_child():
+    global _flusher_lock
+    _flusher_lock = threading.Lock()
+    for metric in _registry:
+        metric.reset()
+
+
+if METRICS_DIR and hasattr(os, 'register_at_fork'):
+    # Values recorded by the master while loading the app would otherwise be counted once per worker
+    os.register_at_fork(after_in_child=_reset_in_child)
+
+
+def _route_label():
+    rule = request.url_rule
+    if rule is None:
+        return 'unmatched'
+    filename = (request.view_args or {}).get('filename')
+    if filename is not None:
+        # Catch-all file routes are split by file type, e.g. building pages vs images
+        ext = os.path.splitext(filename)[1].lower()
+        return f'{rule.rule} [{ext if ext in ROUTE_EXTENSIONS else "other"}]'
+    return rule.rule
+
+
+def _before_request():
+    if METRICS_DIR and _flusher_pid != os.getpid():
+        _start_flusher()
+    g._metrics_start = time.perf_counter()
+    requests_in_flight.inc()
+
+
+def _after_request(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    requests_in_flight.dec()
+    route = _route_label()
+    request_duration.observe(time.perf_counter() - start, route, request.method)
+    requests_total.inc(route, request.method, g.pop('_metrics_status', 500))
+
+
+_render_starts = threading.local()
+
+
+def _before_render(sender, template, context, **extra):
+    _render_starts.start = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    start = getattr(_render_starts, 'start', None)
+    if start is not None:
+        observe('template_render', time.perf_counter() - start)
+        _render_starts.start = None
+
+
+metrics_api = Blueprint('metrics_api', __name__)
+
+
+@metrics_api.route('/metrics')
+def metrics():
+    token = request.headers.get('X-Stats-Token', '')
+    if request.remote_addr not in ('127.0.0.1', '::1') and not (STATS_TOKEN and secrets.compare_digest(token, STATS_TOKEN)):
+        abort(403)
+    return Response(exposition(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Time every request of app and serve /metrics"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.register_blueprint(metrics_api)
@@ -0,0 +1,129 @@
+# Password hashing in a bounded process pool
+# scrypt/pbkdf2 are CPU-bound, so running them on the request thread stalls the
+# whole worker. Hashes made with old parameters are upgraded on login.
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Any werkzeug method string, e.g. "scrypt", "scrypt:32768:8:1" or "pbkdf2:sha256:1000000"
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))  # 0 hashes inline
+HASH_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", "32"))  # jobs waiting beyond the workers
+HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2"))
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+LATENCY_SAMPLES = 1000
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash takes longer than HASH_TIMEOUT"""
+
+
+def _method_prefix(password_hash):
+    return password_hash.split('$', 1)[0]
+
+
+def _configured_prefix(method):
+    """The prefix generate_password_hash writes for method, worked out without running the KDF"""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == 'pbkdf2' and len(args) <= 2:
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"Invalid hash method '{method}'")
+
+
+def _verify(password_hash, password, method, current_prefix):
+    """Worker task: check the password and rehash it if the parameters are outdated"""
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if _method_prefix(password_hash) != current_prefix:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class PasswordHasher:
+    def __init__(self, method=HASH_METHOD, workers=HASH_WORKERS,
+                 queue_depth=HASH_QUEUE_DEPTH, queue_timeout=HASH_QUEUE_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self._queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(1, workers) + queue_depth)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.current_prefix = _configured_prefix(method)
+        self._latencies = {'hash': deque(maxlen=LATENCY_SAMPLES), 'verify': deque(maxlen=LATENCY_SAMPLES)}
+        self.rejected = 0
+        self.timed_out = 0
+        self.rehashed = 0
+
+    def _get_executor(self):
+        # Forked workers must not reuse the parent's pool
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _run(self, kind, fn, *args):
+        if not self._slots.acquire(timeout=self._queue_timeout):
+            self.rejected += 1
+            logger.warning("Password hashing queue full, rejecting request")
+            raise HasherBusy("Password hashing queue is full")
+        start = time.perf_counter()
+        future = None
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            future = self._get_executor().submit(fn, *args)
+            return future.result(timeout=HASH_TIMEOUT)
+        except FutureTimeout:
+            self.timed_out += 1
+            logger.warning(f"Password {kind} took longer than {HASH_TIMEOUT}s, rejecting request")
+            raise HasherBusy("Password hashing timed out") from None
+        finally:
+            if future is not None and not future.done() and not future.cancel():
+                # Still hashing in a pool process: its slot stays taken until it finishes
+                future.add_done_callback(lambda f: self._slots.release())
+            else:
+                self._slots.release()
+            elapsed = time.perf_counter() - start
+            self._latencies[kind].append(elapsed)
+            metrics.observe(f'password_{kind}', elapsed)
+
+    def hash_password(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Returns (matches, new_hash); new_hash is set when the stored hash should be replaced"""
+        ok, new_hash = self._run('verify', _verify, password_hash, password, self.method, self.current_prefix)
+        if new_hash:
+            self.rehashed += 1
+        return ok, new_hash
+
+    def stats(self):
+        result = {'method': self.current_prefix, 'workers': self.workers,
+                  'rejected': self.rejected, 'timed_out': self.timed_out, 'rehashed': self.rehashed}
+        for kind, samples in self._latencies.items():
+            ordered = sorted(samples)
+            result[kind] = {'samples': len(ordered)}
+            for pct in (50, 90, 99):
+                result[kind][f'p{pct}_ms'] = round(ordered[min(len(ordered) - 1, len(ordered) * pct // 100)] * 1000, 2) if ordered else None
+        return result
+
+
+_hasher = PasswordHasher()
+hash_password = _hasher.hash_password
+verify = _hasher.verify
+stats = _hasher.stats
@@ -0,0 +1,171 @@
+# Token-bucket rate limiting with per-endpoint buckets
+# The in-memory backend is O(1) per check and expires idle buckets with a
+# timing wheel; the SQLite backend shares one limit across worker processes.
+import os
+import time
+import sqlite3
+import logging
+import threading
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> (max_requests, window_seconds)
+ENDPOINT_LIMITS = {
+    'login': (3, 60),
+    'register': (2, 60),
+    'forgot_password': (3, 60),
+    'submit': (5, 60),
+}
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # 'memory' or 'sqlite'
+RATE_LIMIT_DATABASE = os.getenv("RATE_LIMIT_DATABASE", "ratelimit.db")
+
+
+class TimingWheel:
+    """Buckets keys by expiry time so expired keys can be found without a scan"""
+
+    def __init__(self, slots=64, resolution=1.0):
+        self._slots = [set() for _ in range(slots)]
+        self._resolution = resolution
+        self._tick = int(time.monotonic() / resolution)
+
+    def schedule(self, key, expires_at):
+        # Expiries beyond the wheel span land in the furthest slot and get rescheduled
+        tick = max(self._tick + 1, min(int(expires_at / self._resolution),
+                                       self._tick + len(self._slots) - 1))
+        self._slots[tick % len(self._slots)].add(key)
+
+    def advance(self, now):
+        """Yield keys from every slot the clock has passed since the last call"""
+        tick = int(now / self._resolution)
+        steps = min(tick - self._tick, len(self._slots))
+        for step in range(1, steps + 1):
+            slot = self._slots[(self._tick + step) % len(self._slots)]
+            if slot:
+                keys = list(slot)
+                slot.clear()
+                yield from keys
+        self._tick = max(self._tick, tick)
+
+
+class MemoryRateLimiter:
+    """Thread-safe token buckets for a single process"""
+
+    def __init__(self):
+        self._buckets = {}  # key -> [tokens, updated, expires_at]
+        self._wheel = TimingWheel()
+        self._lock = threading.Lock()
+
+    def hit(self, key, max_requests, window_seconds):
+        """Take one token for key; returns False if the bucket is empty"""
+        rate = max_requests / window_seconds
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = float(max_requests)
+            else:
+                tokens = min(max_requests, bucket[0] + (now - bucket[1]) * rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+
+            # A bucket that has refilled completely is the same as no bucket
+            expires_at = now + (max_requests - tokens) / rate
+            self._buckets[key] = [tokens, now, expires_at]
+            self._wheel.schedule(key, expires_at)
+            return allowed
+
+    def _expire(self, now):
+        for key in self._wheel.advance(now):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            if bucket[2] <= now:
+                del self._buckets[key]
+            else:
+                self._wheel.schedule(key, bucket[2])
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteRateLimiter:
+    """Token buckets in a shared SQLite file so every worker enforces one limit"""
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path=RATE_LIMIT_DATABASE):
+        self._path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._max_window = max(window for _, window in ENDPOINT_LIMITS.values())
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, cached_statements=16)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing counters on power loss is harmless
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, max_requests, window_seconds):
+        rate = max_requests / window_seconds
+        now = time.time()  # wall clock, shared between processes
+        conn = self._connect()
+
+        # Refill and take a token in one atomic upsert; no row back means the bucket is empty
+        row = conn.execute('''
+            INSERT INTO buckets (key, tokens, updated) VALUES (?1, ?2 - 1, ?3)
+            ON CONFLICT(key) DO UPDATE
+                SET tokens = MIN(?2, tokens + (?3 - updated) * ?4) - 1, updated = ?3
+                WHERE MIN(?2, tokens + (?3 - updated) * ?4) >= 1
+            RETURNING tokens
+        ''', (key, max_requests, now, rate)).fetchone()
+
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = now
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self._max_window,))
+        return row is not None
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+if RATE_LIMIT_BACKEND == 'sqlite':
+    _limiter = SQLiteRateLimiter()
+else:
+    _limiter = MemoryRateLimiter()
+
+_counts = {endpoint: {'allowed': 0, 'rejected': 0} for endpoint in ENDPOINT_LIMITS}
+
+
+def is_rate_limited(endpoint, ip_address):
+    """Count a request from ip_address against the endpoint's limit"""
+    max_requests, window_seconds = ENDPOINT_LIMITS[endpoint]
+    allowed = _limiter.hit(f"{endpoint}:{ip_address}", max_requests, window_seconds)
+    _counts[endpoint]['allowed' if allowed else 'rejected'] += 1
+    if not allowed:
+        logger.warning(f"Rate limit exceeded for {endpoint} from IP {ip_address}")
+    return not allowed
+
+
+metrics.register_callback(
+    'rate_limit_decisions_total', 'Rate limiter decisions by endpoint', 'counter', ('endpoint', 'decision'),
+    lambda: {(endpoint, decision): n for endpoint, counts in _counts.items() for decision, n in counts.items()})
+
+
+def stats():
+    return {'backend': RATE_LIMIT_BACKEND, 'tracked_keys': len(_limiter), 'endpoints': _counts}
@@ -0,0 +1,85 @@
+# Precompiled contact form response pages
+# The success and failure pages never change, so they are rendered once and
+# served as bytes with an ETag; the validation page is a cached compiled template.
+import hashlib
+from flask import Response, request
+import metrics
+
+TEMPLATE = 'submission_message.html'
+
+THEMES = {
+    # University colours used by main.py
+    'main': {
+        'background': '#F5F5F5',
+        'success-message': '#003A70',
+        'error-message': '#003A70',
+        'text': '#FFD100',
+        'button': '#FFD100',
+        'button_text': '#003A70',
+        'button_hover': '#e6be00',
+    },
+    # Original contact form colours used by app.py
+    'contact': {
+        'background': 'rgb(220, 207, 194)',
+        'success-message': 'rgb(136, 110, 110)',
+        'error-message': 'rgb(220, 110, 110)',
+        'text': 'white',
+        'button': 'rgb(220, 207, 194)',
+        'button_text': 'rgb(105, 90, 90)',
+        'button_hover': 'rgb(196, 196, 196)',
+    },
+}
+
+
+class ResponsePages:
+    """Success, failure and validation pages for one app's submit_form"""
+
+    def __init__(self, app, theme, success_link, success_link_text, form_link):
+        self._app = app
+        self._theme = THEMES[theme]
+        self._form_link = form_link
+        self._success = (success_link, success_link_text)
+        self._template = None
+        self._prebuilt = {}
+
+    def _get_template(self):
+        if self._template is None:
+            self._template = self._app.jinja_env.get_template(TEMPLATE)
+        return self._template
+
+    def _render(self, **context):
+        with metrics.timed('template_render'):
+            return self._get_template().render(theme=self._theme, **context)
+
+    def _prebuilt_response(self, name, **context):
+        page = self._prebuilt.get(name)
+        if page is None:
+            body = self._render(**context).encode('utf-8')
+            page = self._prebuilt[name] = (body, hashlib.sha1(body).hexdigest())
+        body, etag = page
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    def success(self):
+        link, link_text = self._success
+        return self._prebuilt_response(
+            'success',
+            title='Submission Successful', box_class='success-message',
+            heading='Thank you for your submission!',
+            message='We have received your inquiry and will respond shortly.',
+            link=link, link_text=link_text)
+
+    def failure(self):
+        return self._prebuilt_response(
+            'failure',
+            title='Submission Error', box_class='error-message',
+            heading='Submission Error',
+            message='We encountered an error processing your submission. Please try again later or contact support.',
+            link=self._form_link, link_text='Return to Contact Form')
+
+    def validation_error(self, error):
+        return self._render(
+            title='Validation Error', box_class='error-message',
+            heading='Form Validation Error', message=error,
+            link=self._form_link, link_text='Return to Contact Form')
@@ -0,0 +1,41 @@
+# Flask secret key shared by every worker and kept across restarts
+# SECRET_KEY from the environment wins. Otherwise a random key is generated on
+# the first start and stored in SECRET_KEY_FILE (readable by its owner only), so
+# session cookies stay valid after a restart and all processes sign them alike.
+import os
+import secrets
+import logging
+
+logger = logging.getLogger(__name__)
+
+SECRET_KEY_FILE = os.getenv("SECRET_KEY_FILE", "secret_key")
+
+
+def load_secret_key(path=SECRET_KEY_FILE):
+    """The configured secret key, or the persisted one (created on first use)"""
+    key = os.getenv("SECRET_KEY")
+    if key:
+        return key
+    try:
+        with open(path) as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+
+    # Write the new key to a private temporary file and link it into place, so a process
+    # starting at the same moment either sees no file or a complete one
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp, path)
+        logger.info(f"Generated a new secret key in {path}")
+    except FileExistsError:
+        pass  # another process won the race; use its key
+    finally:
+        os.unlink(tmp)
+    with open(path) as f:
+        return f.read().strip()
@@ -0,0 +1,328 @@
+# Production server: one preloaded app served by forked worker processes
+# The master loads the configuration, the secret key and the app once, binds the
+# listening socket and forks WEB_WORKERS workers (one per CPU core by default)
+# that share it. Workers inherit the loaded app, so they start at once and share
+# its read-only memory. State that must agree across workers (sessions, rate
+# limits, submission dedupe keys, export slots, the events index) is kept in
+# SQLite files every worker opens, and /metrics sums snapshots that every worker
+# writes to METRICS_DIR. /stats still describes the worker that answers. Only the
+# master writes LOG_FILE; workers send it their log records over a local socket.
+#
+#   python serve.py [--app main|app] [--bind 127.0.0.1:8000] [--workers N]
+#
+# kill -HUP <master pid> reloads the code without dropping requests: the master
+# re-executes itself on the same socket, forks new workers and only then tells
+# the old ones to finish their requests and exit. kill -TERM stops gracefully.
+# Windows has no fork, so there the app is served by one threaded process.
+import os
+import sys
+import time
+import errno
+import socket
+import signal
+import logging
+import shutil
+import argparse
+import tempfile
+import importlib
+import subprocess
+import threading
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+logger = logging.getLogger(__name__)
+
+WEB_BIND = os.getenv("WEB_BIND", "127.0.0.1:8000")
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))  # 0: one per CPU core
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))  # seconds workers get to finish their requests
+KEEPALIVE_TIMEOUT = 5  # seconds an idle keep-alive connection is held open
+LISTEN_BACKLOG = 2048
+
+# Handed to the re-executed master on reload
+LISTEN_FD_ENV = 'SERVE_LISTEN_FD'
+OLD_WORKERS_ENV = 'SERVE_OLD_WORKERS'
+METRICS_DIR_ENV = 'SERVE_METRICS_DIR'  # a METRICS_DIR created by serve.py, removed when it stops
+LOG_FDS_ENV = 'SERVE_LOG_FDS'
+
+# In-memory backends would be counted per worker
+SHARED_BACKENDS = ('RATE_LIMIT_BACKEND', 'DEDUPE_BACKEND', 'EXPORT_SLOTS_BACKEND')
+
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return host.strip('[]') or '0.0.0.0', int(port)
+
+
+def preload(app_name, workers, check=False):
+    """Load the configuration, the secret key and the app once, before any worker starts"""
+    from dotenv import load_dotenv
+    load_dotenv()
+    import secret_key
+    os.environ['SECRET_KEY'] = secret_key.load_secret_key()
+    if workers > 1:
+        for backend in SHARED_BACKENDS:
+            os.environ.setdefault(backend, 'sqlite')
+        # Each worker has its own hashing pool; together they should not outnumber the cores
+        os.environ.setdefault('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+        if not os.getenv('METRICS_DIR') and not check:
+            os.environ['METRICS_DIR'] = os.environ[METRICS_DIR_ENV] = tempfile.mkdtemp(prefix='opendays-metrics-')
+    app = importlib.import_module(app_name).app  # create_app also initializes the user database
+    if 'auth' in app.config['ROUTE_GROUPS']:
+        import user_store
+        user_store.close_connection()  # workers open their own
+    return app
+
+
+def listen(host, port):
+    """The listening socket: inherited from the previous master on reload, else bound here"""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        sock = socket.socket(fileno=int(fd))
+    else:
+        sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def log_channel():
+    """Datagram socket pair workers forward log records on; inherited on reload so old workers keep logging"""
+    fds = os.environ.pop(LOG_FDS_ENV, None)
+    if fds is not None:
+        reader, writer = (socket.socket(fileno=int(fd)) for fd in fds.split(','))
+    else:
+        reader, writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    reader.set_inheritable(True)
+    writer.set_inheritable(True)
+    return reader, writer
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Keep-alive handler that closes idle connections, and every connection once the worker drains"""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.draining:
+            self.close_connection = True
+
+
+def run_worker(app, host, port, sock, spool):
+    """Serve on the shared socket until SIGTERM, then finish the requests in progress"""
+    server = make_server(host, port, app, threaded=True, request_handler=RequestHandler, fd=sock.fileno())
+    server.draining = False
+    server.daemon_threads = False  # server_close() then waits for requests in progress
+    server.block_on_close = True
+
+    def drain(signum, frame):
+        if not server.draining:
+            server.draining = True
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, drain)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    if spool:
+        import submission_spool
+        submission_spool.start_worker()
+    logger.info(f"Worker {os.getpid()} serving")
+    server.serve_forever()
+    server.server_close()
+    logger.info(f"Worker {os.getpid()} stopped")
+
+
+class Master:
+    """Forks the workers, replaces any that die, and handles reload and shutdown signals"""
+
+    def __init__(self, args, app, sock, log_reader, log_writer):
+        self.args = args
+        self.app = app
+        self.sock = sock
+        self.log_reader = log_reader
+        self.log_writer = log_writer
+        self.host, self.port = parse_bind(args.bind)
+        self.workers = set()
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            return
+        # Worker: never return into the master's loop
+        import logging_setup
+        self.log_reader.close()
+        logging_setup.forward_to(self.log_writer)
+        code = 0
+        try:
+            run_worker(self.app, self.host, self.port, self.sock, self.args.spool)
+        except BaseException:
+            logger.exception(f"Worker {os.getpid()} failed")
+            code = 1
+        finally:
+            if self.args.spool:
+                import submission_spool
+                submission_spool.stop_worker()
+            import metrics
+            metrics.write_snapshot()  # the final counts stay in the totals of /metrics
+            logging_setup.shutdown_logging()
+            os._exit(code)
+
+    def reap(self):
+        """Forget workers that have exited"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                self.workers.discard(pid)
+                if not self.stopping:
+                    logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+
+    def stop_workers(self, pids, timeout=GRACEFUL_TIMEOUT):
+        """SIGTERM, then SIGKILL whatever is still running after timeout"""
+        pids = set(pids)
+        for pid in pids:
+            _signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while pids and time.monotonic() < deadline:
+            pids = {pid for pid in pids if _running(pid)}
+            time.sleep(0.1)
+        for pid in pids:
+            logger.warning(f"Worker {pid} did not stop within {timeout}s, killing it")
+            _signal(pid, signal.SIGKILL)
+            _running(pid)
+
+    def retire_previous(self):
+        """After a reload, drain the workers of the previous generation (still our children)"""
+        old = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid]
+        if old:
+            logger.info(f"Stopping {len(old)} workers of the previous generation")
+            self.stop_workers(old)
+
+    def reload(self):
+        """Re-execute the master with the new code on the same socket; the old workers keep serving meanwhile"""
+        # The new master starts from the original environment, so it reads .env and the secret afresh
+        environ = dict(self.args.environ)
+        if METRICS_DIR_ENV in os.environ:
+            # Keep the totals of /metrics across the reload
+            environ['METRICS_DIR'] = environ[METRICS_DIR_ENV] = os.environ[METRICS_DIR_ENV]
+        check = subprocess.run([sys.executable, os.path.abspath(__file__), '--check', '--app', self.args.app],
+                               env=environ, capture_output=True, text=True)
+        if check.returncode != 0:
+            logger.error(f"Reload cancelled, the app failed to load:\n{check.stderr.strip()}")
+            return
+        logger.info("Reloading")
+        environ[LISTEN_FD_ENV] = str(self.sock.fileno())
+        environ[OLD_WORKERS_ENV] = ','.join(map(str, self.workers))
+        environ[LOG_FDS_ENV] = f"{self.log_reader.fileno()},{self.log_writer.fileno()}"
+        import logging_setup
+        logging_setup.stop_receiving()  # records sent from now on wait in the socket for the new master
+        logging_setup.shutdown_logging()
+        os.execve(sys.executable, [sys.executable, os.path.abspath(__file__)] + sys.argv[1:], environ)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        import logging_setup
+        logging_setup.receive_from(self.log_reader, self.log_writer)
+        for _ in range(self.args.workers):
+            self.spawn()
+        logger.info(f"Serving {self.args.app} on {self.args.bind} with {self.args.workers} workers "
+                    f"(master {os.getpid()})")
+        self.retire_previous()
+        while not self.stopping:
+            self.reap()
+            if self.reloading:
+                self.reloading = False
+                self.reload()
+            while not self.stopping and len(self.workers) < self.args.workers:
+                self.spawn()
+            time.sleep(0.5)
+        logger.info("Stopping workers")
+        self.stop_workers(self.workers)
+        logging_setup.stop_receiving()
+        if METRICS_DIR_ENV in os.environ:
+            shutil.rmtree(os.environ[METRICS_DIR_ENV], ignore_errors=True)
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reloading = True
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _running(pid):
+    """Reap pid if it has exited; True while it is still running"""
+    try:
+        done, _ = os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        return False
+    return done == 0
+
+
+def serve_single(app, host, port, spool):
+    """Platforms without fork: one process, one thread per request"""
+    logger.warning("os.fork is not available; serving from a single process")
+    if spool:
+        import submission_spool
+        submission_spool.start_worker()
+    server = make_server(host, port, app, threaded=True, request_handler=RequestHandler)
+    server.draining = False
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run OpendaysMaps with preloaded, forked workers')
+    parser.add_argument('--app', choices=('main', 'app'), default='main', help='main: full site, app: contact form only')
+    parser.add_argument('--bind', default=WEB_BIND, help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=WEB_WORKERS or os.cpu_count() or 1)
+    parser.add_argument('--check', action='store_true', help='load the app and exit (used before a reload)')
+    args = parser.parse_args(argv)
+
+    fork = hasattr(os, 'fork')
+    # Kept for reloads, before preload adds SECRET_KEY and the .env values
+    args.environ = {k: v for k, v in os.environ.items() if k not in (LISTEN_FD_ENV, OLD_WORKERS_ENV, METRICS_DIR_ENV, LOG_FDS_ENV)}
+    reloaded = LISTEN_FD_ENV in os.environ
+    app = preload(args.app, args.workers if fork else 1, args.check)
+    if args.check:
+        return
+    if os.getenv('METRICS_DIR') and not reloaded:
+        import metrics
+        metrics.clear_snapshots()
+    args.spool = 'contact' in app.config['ROUTE_GROUPS'] and app.config['SUBMISSION_MODE'] == 'spool'
+    host, port = parse_bind(args.bind)
+    if not fork:
+        serve_single(app, host, port, args.spool)
+        return
+    try:
+        sock = listen(host, port)
+    except OSError as e:
+        if e.errno == errno.EADDRINUSE:
+            sys.exit(f"{args.bind} is already in use")
+        raise
+    Master(args, app, sock, *log_channel()).run()
+
+
+if __name__ == '__main__':
+    main()
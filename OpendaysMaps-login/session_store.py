@@ -0,0 +1,299 @@
+# Server-side sessions: an in-process LRU in front of a shared SQLite table
+# The cookie only carries a signed random session id. Session data, including
+# the logged-in user's id and email, lives in SQLite so every worker sees the
+# same sessions and a session can be revoked. Each process keeps recently used
+# sessions in memory. PRAGMA data_version tells it when another connection has
+# written, and a small change log then names the sessions to evict. A protected
+# page is therefore authorized without a query, and a logout or revocation in
+# one worker reaches all of them on their next request.
+import os
+import sys
+import time
+import sqlite3
+import logging
+import secrets
+import argparse
+import threading
+from collections import OrderedDict
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SESSION_DATABASE = os.getenv("SESSION_DATABASE", "sessions.db")
+SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))  # seconds a session lives after its last save
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))  # sessions kept in memory per process
+PURGE_INTERVAL = 600  # seconds between deletes of expired rows
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that tracks changes; sid is None until the session is first saved"""
+
+    def __init__(self, initial=None, sid=None, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.previous_sid = None
+        self.modified = False
+
+    def regenerate(self):
+        """Issue a new id on the next save (call on login, against session fixation)"""
+        if self.sid is not None and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class SessionStore(SessionInterface):
+    """Flask session interface backed by SQLite with a per-process LRU cache"""
+
+    serializer = TaggedJSONSerializer()  # keeps flashed (category, message) tuples intact
+
+    def __init__(self, path=SESSION_DATABASE, ttl=SESSION_TTL, cache_size=SESSION_CACHE_SIZE):
+        self._path = path
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._cache = OrderedDict()  # sid -> (payload, expires)
+        self._lock = threading.Lock()
+        self._watch_conn = None
+        self._watch_pid = None
+        self._origin = None  # marks this process's rows in session_changes
+        self._data_version = None
+        self._last_change = 0
+        self._last_purge = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.writes = 0
+
+    def _connect(self):
+        # Forked workers open their own connections
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, cached_statements=16)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER,
+                    data TEXT NOT NULL,
+                    expires REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires)")
+            # Which sessions were written or deleted, so other processes evict just those
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS session_changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sid TEXT NOT NULL,
+                    origin TEXT NOT NULL,
+                    changed REAL NOT NULL
+                )
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _sync(self):
+        """Evict sessions other processes changed since the last call; caller holds the lock"""
+        if self._watch_conn is None or self._watch_pid != os.getpid():
+            self._connect()
+            self._watch_conn = sqlite3.connect(self._path, timeout=5, check_same_thread=False)
+            self._watch_pid = os.getpid()
+            self._origin = secrets.token_hex(8)
+            self._cache.clear()
+            self._data_version = None
+            self._last_change = self._watch_conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM session_changes").fetchone()[0]
+
+        # data_version moves whenever another connection commits; reading it costs no query
+        data_version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        rows = self._watch_conn.execute(
+            "SELECT seq, sid, origin FROM session_changes WHERE seq > ? ORDER BY seq", (self._last_change,)).fetchall()
+        if rows and rows[0][0] > self._last_change + 1:
+            # Changes we never saw were purged already; start over
+            self._cache.clear()
+        for seq, sid, origin in rows:
+            if origin != self._origin and self._cache.pop(sid, None) is not None:
+                self.invalidated += 1
+        if rows:
+            self._last_change = rows[-1][0]
+        self._data_version = data_version
+
+    def _remember(self, sid, payload, expires):
+        self._cache[sid] = (payload, expires)
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _record_changes(self, conn, sids):
+        now = time.time()
+        conn.executemany("INSERT INTO session_changes (sid, origin, changed) VALUES (?, ?, ?)",
+                         [(sid, self._origin, now) for sid in sids])
+
+    # Storage
+
+    def load(self, sid):
+        """(payload, expires) for a live session, or None"""
+        now = time.time()
+        with self._lock:
+            self._sync()
+            cached = self._cache.get(sid)
+            if cached is not None:
+                self._cache.move_to_end(sid)
+                self.hits += 1
+                return cached if cached[1] > now else None
+            self.misses += 1
+            seen = self._last_change
+        row = self._connect().execute("SELECT data, expires FROM sessions WHERE id = ?", (sid,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        with self._lock:
+            # If any session changed while we read, this row may already be stale; leave it uncached
+            self._sync()
+            if self._last_change == seen:
+                self._remember(sid, row[0], row[1])
+        return row
+
+    def save(self, sid, user_id, payload, expires):
+        with self._lock:
+            self._sync()
+        conn = self._connect()
+        with metrics.timed('session_write'):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("INSERT INTO sessions (id, user_id, data, expires) VALUES (?, ?, ?, ?) "
+                             "ON CONFLICT (id) DO UPDATE SET user_id = excluded.user_id, data = excluded.data, "
+                             "expires = excluded.expires", (sid, user_id, payload, expires))
+                self._record_changes(conn, [sid])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        with self._lock:
+            self._remember(sid, payload, expires)
+            self.writes += 1
+        self._purge_expired()
+
+    def _delete_where(self, where, params):
+        """Delete sessions matching where, in every process; returns their ids"""
+        with self._lock:
+            self._sync()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            sids = [row[0] for row in conn.execute(f"SELECT id FROM sessions WHERE {where}", params)]
+            conn.execute(f"DELETE FROM sessions WHERE {where}", params)
+            self._record_changes(conn, sids)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            for sid in sids:
+                self._cache.pop(sid, None)
+        return sids
+
+    def delete(self, sid):
+        self._delete_where("id = ?", (sid,))
+
+    def revoke_user(self, user_id):
+        """End every session of a user, in all workers; returns the number ended"""
+        count = len(self._delete_where("user_id = ?", (user_id,)))
+        logger.info(f"Revoked {count} sessions of user {user_id}")
+        return count
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = now
+            conn = self._connect()
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+            conn.execute("DELETE FROM session_changes WHERE changed < ?", (now - PURGE_INTERVAL,))
+
+    def stats(self):
+        with self._lock:
+            return {'cached': len(self._cache), 'hits': self.hits, 'misses': self.misses,
+                    'invalidated': self.invalidated, 'writes': self.writes}
+
+    # Flask SessionInterface
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie and app.secret_key:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            stored = self.load(sid) if sid else None
+            if stored is not None:
+                return ServerSession(self.serializer.loads(stored[0]), sid, stored[1])
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid is not None:
+            self.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            # Logged out or never used: drop the stored session and the cookie
+            if session.sid is not None and session.modified:
+                self.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app))
+            return
+
+        now = time.time()
+        # Unchanged sessions are written again only once half their lifetime has passed
+        if not session.modified and session.expires is not None and session.expires - now > self.ttl / 2:
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires = now + self.ttl
+        self.save(session.sid, session.get('user_id'), self.serializer.dumps(dict(session)), session.expires)
+        response.set_cookie(name, self._signer(app).sign(session.sid).decode(), max_age=self.ttl,
+                            domain=domain, path=path, secure=self.get_cookie_secure(app),
+                            httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app))
+        response.vary.add('Cookie')
+
+
+session_store = SessionStore()
+
+
+def stats():
+    return session_store.stats()
+
+
+if __name__ == '__main__':
+    # python session_store.py revoke-user 42   (forced logout of user 42 in every worker)
+    parser = argparse.ArgumentParser(description='Manage server-side sessions')
+    commands = parser.add_subparsers(dest='command', required=True)
+    revoke = commands.add_parser('revoke-user', help='end every session of a user id')
+    revoke.add_argument('user_id', type=int)
+    commands.add_parser('purge', help='delete expired sessions')
+    args = parser.parse_args()
+    if args.command == 'revoke-user':
+        print(f"{session_store.revoke_user(args.user_id)} sessions revoked")
+    else:
+        session_store._last_purge = 0.0
+        session_store._purge_expired()
+    sys.exit(0)
@@ -0,0 +1,155 @@
+# In-memory static asset cache with conditional GET support
+# Small files are kept in an LRU keyed by path and mtime, with strong ETags and
+# precompressed variants for text assets. Large files skip the cache and go out
+# through send_file, which lets the WSGI server use sendfile.
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli  # optional; gzip is always available
+except ImportError:
+    brotli = None
+
+STATIC_CACHE_MAX_BYTES = int(os.getenv("STATIC_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+STATIC_SENDFILE_THRESHOLD = int(os.getenv("STATIC_SENDFILE_THRESHOLD", str(1024 * 1024)))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/javascript', 'application/javascript',
+                      'application/json', 'image/svg+xml', 'text/plain'}
+MIN_COMPRESS_SIZE = 512
+
+
+class _Asset:
+    __slots__ = ('mtime', 'size', 'body', 'etag', 'mimetype', 'variants', 'memory')
+
+    def __init__(self, path, st, rewrite_html=None):
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.mtime = st.st_mtime_ns
+        self.size = st.st_size  # of the file on disk, used to detect changes
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if rewrite_html is not None and self.mimetype == 'text/html':
+            self.body = rewrite_html(self.body)
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+        # Precompressed variants, only kept when they are actually smaller
+        self.variants = {}
+        if self.mimetype in COMPRESSIBLE_TYPES and len(self.body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(self.body, quality=11)
+            self.variants['gzip'] = gzip.compress(self.body, compresslevel=9, mtime=0)
+            self.variants = {k: v for k, v in self.variants.items() if len(v) < len(self.body)}
+        self.memory = len(self.body) + sum(len(v) for v in self.variants.values())
+
+
+class StaticCache:
+    """Serves files below root, caching their bytes in memory
+
+    rewrite_html, if given, is applied to HTML files once when they are loaded.
+    """
+
+    def __init__(self, root, max_bytes=STATIC_CACHE_MAX_BYTES,
+                 sendfile_threshold=STATIC_SENDFILE_THRESHOLD, max_age=STATIC_MAX_AGE, rewrite_html=None):
+        self.root = os.path.abspath(root)
+        self.rewrite_html = rewrite_html
+        self.max_bytes = max_bytes
+        self.sendfile_threshold = sendfile_threshold
+        self.max_age = max_age
+        self._assets = OrderedDict()  # path -> _Asset, least recently used first
+        self._memory = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+        self.sendfile = 0
+
+    def serve(self, filename):
+        """Response for filename relative to root; raises NotFound if it does not exist"""
+        path = safe_join(self.root, filename)
+        if path is None:
+            raise NotFound()
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise NotFound()
+        if not os.path.isfile(path):
+            raise NotFound()
+
+        if st.st_size > self.sendfile_threshold:
+            self.sendfile += 1
+            return send_file(path, conditional=True, etag=True, max_age=self.max_age)
+
+        asset = self._get(path, st)
+        encoding = self._choose_encoding(asset)
+        body = asset.variants[encoding] if encoding else asset.body
+
+        response = Response(body, mimetype=asset.mimetype)
+        # Each encoding is a different representation, so it needs its own strong ETag
+        response.set_etag(f"{asset.etag}-{encoding}" if encoding else asset.etag)
+        response.last_modified = st.st_mtime
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.content_encoding = encoding
+
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def _choose_encoding(self, asset):
+        if not asset.variants:
+            return None
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.variants and accepted[encoding]:
+                return encoding
+        return None
+
+    def _get(self, path, st):
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is not None and asset.mtime == st.st_mtime_ns and asset.size == st.st_size:
+                self._assets.move_to_end(path)
+                self.hits += 1
+                return asset
+
+        # Read and compress outside the lock
+        asset = _Asset(path, st, self.rewrite_html)
+        with self._lock:
+            self.misses += 1
+            old = self._assets.pop(path, None)
+            if old is not None:
+                self._memory -= old.memory
+            if asset.memory <= self.max_bytes:
+                self._assets[path] = asset
+                self._memory += asset.memory
+                while self._memory > self.max_bytes:
+                    _, evicted = self._assets.popitem(last=False)
+                    self._memory -= evicted.memory
+                    self.evictions += 1
+        return asset
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._assets),
+                'memory_bytes': self._memory,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'not_modified': self.not_modified,
+                'sendfile': self.sendfile,
+                'brotli': brotli is not None,
+            }
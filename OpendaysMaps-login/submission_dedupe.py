@@ -0,0 +1,272 @@
+# Idempotent contact form submissions
+# A repeat of an accepted submission (a double-click, a browser retry, a refresh
+# of the success page) gets the original success response again instead of
+# another row and another database round trip. Submissions are recognised by
+# the idempotency key sent with the form (or the Idempotency-Key header), or
+# else by a hash of the normalized email, subject and details. Accepted keys are
+# remembered for DEDUPE_WINDOW seconds, in a bounded per-process cache or, with
+# DEDUPE_BACKEND=sqlite (serve.py's default for several workers), in a SQLite file
+# every worker shares, so a repeat is recognised whichever worker receives it. A
+# repeat never writes while the original is in flight: it waits up to DEDUPE_WAIT
+# for the outcome and then gets SubmissionPending. A write that timed out but may
+# still commit stays in flight until its outcome is known.
+import os
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_WINDOW = float(os.getenv("DEDUPE_WINDOW", "600"))  # seconds a submission counts as a repeat
+DEDUPE_CACHE_SIZE = int(os.getenv("DEDUPE_CACHE_SIZE", "10000"))  # accepted submissions remembered
+DEDUPE_BACKEND = os.getenv("DEDUPE_BACKEND", "memory").lower()  # 'memory' or 'sqlite'
+DEDUPE_DATABASE = os.getenv("DEDUPE_DATABASE", "submission_dedupe.db")  # sqlite backend only
+DEDUPE_WAIT = 5  # seconds a repeat waits for the original that is still being written
+MAX_KEY_LENGTH = 128
+KEY_FIELD = 'idempotency_key'  # hidden form field filled in by site.js
+
+
+class SubmissionPending(Exception):
+    """Raised for a repeat whose original is still being written after DEDUPE_WAIT"""
+
+
+def _normalize(value):
+    return ' '.join((value or '').split()).casefold()
+
+
+def submission_key(email, subject, details, idempotency_key=None):
+    """Cache key for a submission: its idempotency key if it has one, else its content"""
+    if idempotency_key:
+        # Scoped to the email, so a key seen elsewhere cannot suppress someone else's submission
+        raw = f"key\x1f{_normalize(email)}\x1f{idempotency_key[:MAX_KEY_LENGTH]}"
+    else:
+        raw = '\x1f'.join(('content', _normalize(email), _normalize(subject), _normalize(details)))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class DedupeCache:
+    """Keys of recently accepted submissions, bounded and expiring after window seconds"""
+
+    def __init__(self, window=DEDUPE_WINDOW, max_entries=DEDUPE_CACHE_SIZE, wait=DEDUPE_WAIT):
+        self.window = window
+        self.max_entries = max_entries
+        self.wait = wait
+        self._entries = OrderedDict()  # key -> expiry time, or an Event while the first copy is written
+        self._uncertain = set()  # in-flight keys whose write timed out but may still commit
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.pending_rejections = 0
+
+    def _expire(self, now):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if isinstance(entry, threading.Event) or entry > now:
+                break
+            del self._entries[key]
+
+    def begin(self, key):
+        """A claim token if the caller should write the submission, None if it repeats an accepted one
+
+        Raises SubmissionPending if another copy is still being written after wait seconds
+        """
+        deadline = None
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                entry = self._entries.get(key)
+                if entry is None:
+                    token = self._entries[key] = threading.Event()
+                    self.misses += 1
+                    return token
+                if not isinstance(entry, threading.Event):
+                    self.hits += 1
+                    return None
+                if deadline is None:
+                    self.waits += 1
+                    deadline = now + self.wait
+                elif now >= deadline:
+                    # Writing another copy could duplicate a row that is still being committed
+                    self.pending_rejections += 1
+                    raise SubmissionPending("The original submission is still being saved")
+            # Same submission in flight on another thread (a double-click): wait for its outcome
+            entry.wait(max(deadline - now, 0))
+
+    def finish(self, key, token, accepted):
+        """Record the outcome of the write that begin() returned token for"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is token or accepted:
+                del self._entries[key]
+            if accepted:
+                self._entries[key] = time.monotonic() + self.window
+                while len(self._entries) > self.max_entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    if isinstance(evicted, threading.Event):
+                        evicted.set()
+        token.set()
+        if isinstance(entry, threading.Event) and accepted:
+            entry.set()  # another claim, taken after this one was evicted, now finds the accepted key
+
+    def finish_later(self, key, token, future):
+        """Keep the claim in flight until future resolves, then record whether the write succeeded"""
+        with self._lock:
+            self._uncertain.add(key)
+
+        def resolved(f):
+            with self._lock:
+                self._uncertain.discard(key)
+            self.finish(key, token, not f.cancelled() and f.exception() is None)
+        future.add_done_callback(resolved)
+
+    @contextmanager
+    def claim(self, key):
+        """with claim(key) as first: write only if first; the key is remembered if the block succeeds
+
+        If the block fails with an error carrying a pending future (a timed-out database call
+        that is still running), the outcome is taken from that future once it resolves
+        """
+        token = self.begin(key)
+        if token is None:
+            yield False
+            return
+        accepted = False
+        pending = None
+        try:
+            yield True
+            accepted = True
+        except BaseException as e:
+            pending = getattr(e, 'pending', None)
+            raise
+        finally:
+            if pending is not None:
+                self.finish_later(key, token, pending)
+            else:
+                self.finish(key, token, accepted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'waits': self.waits,
+                    'uncertain': len(self._uncertain), 'pending_rejections': self.pending_rejections,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0, 'window': self.window,
+                    'backend': 'memory'}
+
+
+class SQLiteDedupeCache(DedupeCache):
+    """The same cache in a SQLite file shared by every worker process"""
+
+    WRITING, ACCEPTED, UNCERTAIN = 0, 1, 2
+    CLAIM_TTL = 60  # seconds a claim blocks repeats, should its worker die before it finishes
+    POLL_INTERVAL = 0.05
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path=DEDUPE_DATABASE, window=DEDUPE_WINDOW, wait=DEDUPE_WAIT):
+        super().__init__(window=window, wait=wait)
+        self._path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, cached_statements=16)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS submission_keys (
+                    key TEXT PRIMARY KEY,
+                    state INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    claim TEXT
+                ) WITHOUT ROWID
+            ''')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _try_begin(self, key, token):
+        """Claim the key with token unless a live entry holds it; None if claimed, else that entry's state"""
+        conn = self._connect()
+        now = time.time()  # wall clock, shared between processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state, expires FROM submission_keys WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                # New, or expired (a claim whose worker died counts as expired after CLAIM_TTL)
+                conn.execute("INSERT OR REPLACE INTO submission_keys (key, state, expires, claim) VALUES (?, ?, ?, ?)",
+                             (key, self.WRITING, now + self.CLAIM_TTL, token))
+                row = None
+            if now - self._last_purge > self.PURGE_INTERVAL:
+                self._last_purge = now
+                conn.execute("DELETE FROM submission_keys WHERE expires < ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else row[0]
+
+    def begin(self, key):
+        token = uuid.uuid4().hex
+        deadline = None
+        while True:
+            state = self._try_begin(key, token)
+            if state is None:
+                self._count('misses')
+                return token
+            if state == self.ACCEPTED:
+                self._count('hits')
+                return None
+            if deadline is None:
+                # Same submission in flight here or on another worker: poll for its outcome
+                self._count('waits')
+                deadline = time.monotonic() + self.wait
+            elif time.monotonic() >= deadline:
+                self._count('pending_rejections')
+                raise SubmissionPending("The original submission is still being saved")
+            time.sleep(self.POLL_INTERVAL)
+
+    def finish(self, key, token, accepted):
+        conn = self._connect()
+        if accepted:
+            conn.execute("INSERT OR REPLACE INTO submission_keys (key, state, expires, claim) VALUES (?, ?, ?, NULL)",
+                         (key, self.ACCEPTED, time.time() + self.window))
+        else:
+            # Only this claim: the key may have been claimed again since this one expired
+            conn.execute("DELETE FROM submission_keys WHERE key = ? AND claim = ?", (key, token))
+
+    def finish_later(self, key, token, future):
+        self._connect().execute("UPDATE submission_keys SET state = ?, expires = ? WHERE key = ? AND claim = ?",
+                                (self.UNCERTAIN, time.time() + self.CLAIM_TTL, key, token))
+        future.add_done_callback(lambda f: self.finish(key, token, not f.cancelled() and f.exception() is None))
+
+    def stats(self):
+        conn = self._connect()
+        entries = conn.execute("SELECT COUNT(*) FROM submission_keys WHERE expires > ?", (time.time(),)).fetchone()[0]
+        uncertain = conn.execute("SELECT COUNT(*) FROM submission_keys WHERE state = ? AND expires > ?",
+                                 (self.UNCERTAIN, time.time())).fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': entries, 'hits': self.hits, 'misses': self.misses, 'waits': self.waits,
+                    'uncertain': uncertain, 'pending_rejections': self.pending_rejections,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0, 'window': self.window,
+                    'backend': 'sqlite'}
+
+
+if DEDUPE_BACKEND == 'sqlite':
+    _cache = SQLiteDedupeCache()
+else:
+    _cache = DedupeCache()
+
+claim = _cache.claim
+stats = _cache.stats
@@ -0,0 +1,370 @@
+# Streaming export of contact submissions for staff (CSV or NDJSON)
+# Rows are read from SQL Server with fetchmany in fixed-size chunks and written
+# to the response as each chunk arrives, so memory stays flat however large the
+# table or the details column is. The same generator backs the HTTP endpoint
+# and the command line export.
+import io
+import os
+import csv
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, date, timedelta
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context
+from db_pool import get_pool
+from auth import is_staff
+import metrics
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))  # rows per fetchmany and per written chunk
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))  # exports holding a pooled connection
+# 'sqlite' counts EXPORT_MAX_CONCURRENT across every worker process instead of per process
+EXPORT_SLOTS_BACKEND = os.getenv("EXPORT_SLOTS_BACKEND", "memory").lower()
+EXPORT_SLOTS_DATABASE = os.getenv("EXPORT_SLOTS_DATABASE", "export_slots.db")
+EXPORT_QUERY_TIMEOUT = int(os.getenv("EXPORT_QUERY_TIMEOUT", "0"))  # seconds, 0 waits as long as the download
+
+COLUMNS = ('id', 'name', 'student_id', 'email', 'subject', 'details', 'submission_date', 'ip_address',
+           'status', 'last_updated')
+STATUSES = ('New', 'In Progress', 'Resolved', 'Closed')
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+# Cells starting with these are evaluated as formulas when the CSV is opened in Excel
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportBusy(Exception):
+    """Raised when EXPORT_MAX_CONCURRENT exports are already running"""
+
+
+def build_query(since=None, until=None, statuses=()):
+    """SELECT for the export, filtered by submission date range [since, until) and status"""
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("submission_date >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("submission_date < ?")
+        params.append(until)
+    if statuses:
+        clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    return f"SELECT {', '.join(COLUMNS)} FROM contact_submissions{where} ORDER BY id", params
+
+
+def _json_value(value):
+    return value.isoformat(sep=' ') if isinstance(value, datetime) else value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _SharedSlots:
+    """Export slots in a SQLite file, so the limit holds across worker processes
+
+    A slot is a row naming the process that holds it; rows left by a process that died
+    mid-export are reclaimed by the next export that finds the slots full
+    """
+
+    def __init__(self, max_concurrent, path=EXPORT_SLOTS_DATABASE):
+        self.max_concurrent = max_concurrent
+        self._path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS export_slots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pid INTEGER NOT NULL,
+                started REAL NOT NULL
+            )
+        ''')
+        return conn
+
+    def acquire(self):
+        """Slot id, or None if every slot is taken"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            holders = conn.execute("SELECT id, pid FROM export_slots").fetchall()
+            if len(holders) >= self.max_concurrent:
+                dead = [(slot,) for slot, pid in holders if not _process_alive(pid)]
+                conn.executemany("DELETE FROM export_slots WHERE id = ?", dead)
+                if len(holders) - len(dead) >= self.max_concurrent:
+                    conn.execute("COMMIT")
+                    return None
+            slot = conn.execute("INSERT INTO export_slots (pid, started) VALUES (?, ?)",
+                                (os.getpid(), time.time())).lastrowid
+            conn.execute("COMMIT")
+            return slot
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            conn.close()
+
+    def release(self, slot):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM export_slots WHERE id = ?", (slot,))
+        finally:
+            conn.close()
+
+
+class _Exports:
+    """Concurrency limit and counters shared by every export in the process"""
+
+    def __init__(self, max_concurrent=EXPORT_MAX_CONCURRENT, backend=EXPORT_SLOTS_BACKEND):
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._shared = _SharedSlots(max(1, max_concurrent)) if backend == 'sqlite' else None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.completed = 0
+        self.aborted = 0
+        self.rejected = 0
+        self.rows = 0
+
+    def acquire(self):
+        """Take an export slot; returns the token to pass to release()"""
+        if self._shared is not None:
+            token = self._shared.acquire()
+            taken = token is not None
+        else:
+            token = None
+            taken = self._slots.acquire(blocking=False)
+        if not taken:
+            with self._lock:
+                self.rejected += 1
+            raise ExportBusy("Too many exports running")
+        with self._lock:
+            self.active += 1
+        return token
+
+    def release(self, token, rows, finished):
+        with self._lock:
+            self.active -= 1
+            self.rows += rows
+            if finished:
+                self.completed += 1
+            else:
+                self.aborted += 1
+        if self._shared is not None:
+            self._shared.release(token)
+        else:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'active': self.active, 'completed': self.completed, 'aborted': self.aborted,
+                    'rejected': self.rejected, 'rows': self.rows, 'chunk_size': EXPORT_CHUNK_SIZE,
+                    'slots_backend': 'sqlite' if self._shared is not None else 'memory'}
+
+
+_exports = _Exports()
+
+
+def stats():
+    return _exports.stats()
+
+
+def iter_rows(since=None, until=None, statuses=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of up to chunk_size rows, reading them from SQL Server as they are consumed"""
+    sql, params = build_query(since, until, statuses)
+    with get_pool().connection() as conn:
+        previous_timeout = conn.timeout
+        conn.timeout = EXPORT_QUERY_TIMEOUT
+        cursor = conn.cursor()
+        try:
+            with metrics.timed('sql_export_query'):
+                cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            conn.commit()  # ends the read transaction before the connection goes back to the pool
+        finally:
+            cursor.close()
+            conn.timeout = previous_timeout
+
+
+def iter_csv(chunks):
+    """Encoded CSV, one bytes chunk per row chunk; the BOM lets Excel detect UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    prefix = '\ufeff'
+    for rows in chunks:
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield (prefix + buffer.getvalue()).encode()
+        prefix = ''
+        buffer.seek(0)
+        buffer.truncate()
+    if prefix:
+        yield (prefix + buffer.getvalue()).encode()  # header only, nothing matched
+
+
+def iter_ndjson(chunks):
+    """Encoded NDJSON, one bytes chunk per row chunk"""
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(COLUMNS, map(_json_value, row))), ensure_ascii=False) + '\n'
+                      for row in rows).encode()
+
+
+_ENCODERS = {'csv': iter_csv, 'ndjson': iter_ndjson}
+
+
+class ExportStream:
+    """Iterator over the export's byte chunks; close() ends the query and frees the export slot"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        # Run the query now, so a database error becomes an error response rather than a cut-off file,
+        # and so close() finds a started generator whose cleanup will run
+        self._first = next(chunks, None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            return first
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+
+
+def export(fmt, since=None, until=None, statuses=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """ExportStream of the encoded rows; holds an export slot until it is exhausted or closed"""
+    token = _exports.acquire()
+    counted = [0]
+
+    def counting(chunks):
+        for rows in chunks:
+            counted[0] += len(rows)
+            yield rows
+
+    def generate():
+        finished = False
+        try:
+            yield from _ENCODERS[fmt](counting(iter_rows(since, until, statuses, chunk_size)))
+            finished = True
+        finally:
+            _exports.release(token, counted[0], finished)
+            logger.info(f"Submission export ({fmt}) {'finished' if finished else 'aborted'} after {counted[0]} rows")
+    return ExportStream(generate())
+
+
+def parse_bound(value, end=False):
+    """ISO date or date-time; a plain date as an upper bound includes that whole day"""
+    if not value:
+        return None
+    if len(value) == 10:
+        day = date.fromisoformat(value)
+        moment = datetime(day.year, day.month, day.day)
+        return moment + timedelta(days=1) if end else moment
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        raise ValueError("times must be local, without a UTC offset")
+    return moment
+
+
+def parse_statuses(value):
+    statuses = tuple(s.strip() for s in (value or '').split(',') if s.strip())
+    unknown = [s for s in statuses if s not in STATUSES]
+    if unknown:
+        raise ValueError(f"unknown status {unknown[0]!r}")
+    return statuses
+
+
+submission_export = Blueprint('submission_export', __name__)
+
+
+def _error(message, status=400):
+    return jsonify({'error': message}), status
+
+
+@submission_export.route('/api/submissions/export')
+def export_submissions():
+    """?format=csv|ndjson&since=&until=&status=New,In Progress"""
+    if 'user_id' not in session:
+        return _error('Login required', 401)
+    if not is_staff():
+        return _error('Staff only', 403)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return _error('format must be csv or ndjson')
+    try:
+        since = parse_bound(request.args.get('since'))
+        until = parse_bound(request.args.get('until'), end=True)
+        statuses = parse_statuses(request.args.get('status'))
+    except ValueError as e:
+        return _error(f'Invalid filter: {e}')
+    try:
+        body = export(fmt, since, until, statuses)
+    except ExportBusy as e:
+        return _error(str(e), 503)
+    except Exception as e:
+        logger.error(f"Submission export failed: {e}")
+        return _error('Export failed', 500)
+
+    # No Content-Length, so the server sends the chunks as they are produced
+    response = Response(stream_with_context(body), mimetype=FORMATS[fmt])
+    stamp = datetime.now().strftime('%Y%m%d-%H%M')
+    response.headers['Content-Disposition'] = f'attachment; filename="submissions-{stamp}.{fmt}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # let a proxy pass chunks straight through
+    return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export contact submissions from SQL Server')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--since', help='first submission date (YYYY-MM-DD or ISO date-time)')
+    parser.add_argument('--until', help='last submission date, inclusive for a plain date')
+    parser.add_argument('--status', help=f'comma-separated, any of: {", ".join(STATUSES)}')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+    args = parser.parse_args(argv)
+    try:
+        since = parse_bound(args.since)
+        until = parse_bound(args.until, end=True)
+        statuses = parse_statuses(args.status)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export(args.format, since, until, statuses, args.chunk_size):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    print(f"{_exports.rows} rows exported", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    # python submission_export.py --format ndjson --since 2025-06-14 --status New -o new.ndjson
+    main()
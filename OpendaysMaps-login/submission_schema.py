@@ -0,0 +1,151 @@
+# Declarative schema for contact form submissions
+# The field rules are declared once as msgspec constraints on the Submission
+# Struct. At import they are compiled into a table of length checks and regex
+# matchers, so a form is stripped, checked and built in a single loop that
+# reports every invalid field. The same schema validates JSON bodies and bulk
+# import files.
+import os
+import re
+import csv
+import sys
+import json
+from typing import Annotated, get_args
+import msgspec
+
+Name = Annotated[str, msgspec.Meta(min_length=1, max_length=100, pattern=r"^[A-Za-z0-9\s\-'\.]+$")]
+StudentId = Annotated[str, msgspec.Meta(pattern=r'^(?:[0-9]{7,8})?$')]  # optional
+Email = Annotated[str, msgspec.Meta(min_length=1, max_length=120,
+                                    pattern=r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')]
+Subject = Annotated[str, msgspec.Meta(min_length=1, max_length=200, pattern=r"^[A-Za-z0-9\s\-'\.,:;!?()]+$")]
+Details = Annotated[str, msgspec.Meta(max_length=2000)]
+
+
+class Submission(msgspec.Struct, frozen=True):
+    name: Name
+    email: Email
+    subject: Subject
+    student_id: StudentId = ''
+    details: Details = ''
+
+
+class FieldError(msgspec.Struct, frozen=True):
+    field: str
+    message: str
+
+
+# (field, form input name, type, message shown to the user)
+FIELDS = (
+    ('name', 'Name', Name, 'Invalid name format'),
+    ('student_id', 'ID', StudentId, 'Invalid student ID format'),
+    ('email', 'Email', Email, 'Invalid email format'),
+    ('subject', 'Subject', Subject, 'Invalid subject format'),
+    ('details', 'Details', Details, 'Details too long or invalid'),
+)
+
+_json_object = msgspec.json.Decoder(dict)
+_json_rows = msgspec.json.Decoder(list)
+
+
+def _compile(field_type):
+    """(min_length, max_length, regex search or None) from a field's msgspec.Meta"""
+    meta = get_args(field_type)[1]
+    search = re.compile(meta.pattern).search if meta.pattern else None  # msgspec patterns are searched too
+    return meta.min_length or 0, meta.max_length or sys.maxsize, search
+
+
+# (input key, field, min_length, max_length, search, message), keyed by field names or form names
+_CHECKS = tuple((field, field, *_compile(field_type), message) for field, _, field_type, message in FIELDS)
+_FORM_CHECKS = tuple((form_name, field, *_compile(field_type), message)
+                     for field, form_name, field_type, message in FIELDS)
+
+
+def _check(get, checks):
+    """One pass over the fields: strip, check and collect (values, errors)"""
+    values = {}
+    errors = []
+    for key, field, min_length, max_length, search, message in checks:
+        value = get(key, '')
+        if value.__class__ is str:
+            value = value.strip()
+            if min_length <= len(value) <= max_length and (search is None or search(value)):
+                values[field] = value
+                continue
+        errors.append(FieldError(field, message))
+    return values, errors
+
+
+def validate(values, by_form_name=False):
+    """Check a dict of submitted values; returns (Submission or None, [FieldError])"""
+    checked, errors = _check(values.get, _FORM_CHECKS if by_form_name else _CHECKS)
+    if errors:
+        return None, errors
+    return Submission(**checked), []
+
+
+def from_form(form):
+    """Validate a submitted HTML form (Name, ID, Email, Subject, Details)"""
+    return validate(form, by_form_name=True)
+
+
+def from_json(body):
+    """Validate a JSON object with the schema field names"""
+    try:
+        values = _json_object.decode(body)
+    except msgspec.DecodeError as e:
+        return None, [FieldError('', f'Invalid JSON: {e}')]
+    return validate(values)
+
+
+def error_message(errors):
+    """The single line shown on the validation error page"""
+    return "Validation errors: " + ", ".join(error.message for error in errors)
+
+
+def errors_json(errors):
+    return msgspec.to_builtins(errors)
+
+
+def validate_many(rows, by_form_name=False):
+    """Validate an iterable of dicts; returns ([Submission], [(row number, [FieldError])])"""
+    valid, invalid = [], []
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            invalid.append((number, [FieldError('', 'Not an object')]))
+            continue
+        submission, errors = validate(row, by_form_name)
+        if errors:
+            invalid.append((number, errors))
+        else:
+            valid.append(submission)
+    return valid, invalid
+
+
+def load_file(path):
+    """Rows from a .json (array), .ndjson/.jsonl or .csv import file"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            return list(csv.DictReader(f))
+    with open(path, 'rb') as f:
+        data = f.read()
+    if ext in ('.ndjson', '.jsonl'):
+        return [_json_object.decode(line) for line in data.splitlines() if line.strip()]
+    return _json_rows.decode(data)
+
+
+def validate_file(path):
+    """Validate an import file; headers may be form names (Name, ID, ...) or field names"""
+    rows = load_file(path)
+    by_form_name = bool(rows) and isinstance(rows[0], dict) and 'Name' in rows[0]
+    return validate_many(rows, by_form_name)
+
+
+if __name__ == '__main__':
+    # python submission_schema.py import.csv
+    if len(sys.argv) != 2:
+        sys.exit("usage: python submission_schema.py FILE.{csv,json,ndjson}")
+    valid, invalid = validate_file(sys.argv[1])
+    for number, errors in invalid:
+        print(json.dumps({'row': number, 'errors': msgspec.to_builtins(errors)}))
+    print(f"{len(valid)} valid, {len(invalid)} invalid", file=sys.stderr)
+    sys.exit(1 if invalid else 0)
@@ -0,0 +1,249 @@
+# Write-behind queue for contact form submissions
+# Submissions are appended to a local SQLite spool (WAL mode) and a background
+# worker flushes them to SQL Server in batches, retrying with backoff while the
+# database is slow or unavailable.
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import atexit
+from datetime import datetime
+import submission_store
+from submission_store import SubmissionRow, StorageUnavailable, SubmissionRejected
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DATABASE = os.getenv("SPOOL_DATABASE", "submission_spool.db")
+SPOOL_BATCH_SIZE = int(os.getenv("SPOOL_BATCH_SIZE", "200"))
+SPOOL_FLUSH_INTERVAL = float(os.getenv("SPOOL_FLUSH_INTERVAL", "0.5"))  # max delay before a flush
+SPOOL_MAX_BACKOFF = float(os.getenv("SPOOL_MAX_BACKOFF", "60"))
+SPOOL_LEASE_SECONDS = float(os.getenv("SPOOL_LEASE_SECONDS", "120"))  # reclaim rows from dead workers
+SPOOL_SYNCHRONOUS = os.getenv("SPOOL_SYNCHRONOUS", "FULL")  # FULL survives power loss, NORMAL is faster
+
+# Errors that mean the database is unreachable, as opposed to a bad row
+TRANSIENT_ERRORS = (StorageUnavailable,)
+
+_local = threading.local()
+
+
+def _connect():
+    """Per-thread spool connection"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(SPOOL_DATABASE, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={SPOOL_SYNCHRONOUS}")
+        _init_spool(conn)
+        _local.conn = conn
+    return conn
+
+
+def _init_spool(conn):
+    """Create the spool tables if they do not exist"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS spool (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            student_id TEXT,
+            email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            details TEXT NOT NULL,
+            submission_date TEXT NOT NULL,
+            ip_address TEXT,
+            claimed_by TEXT,
+            claimed_at REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dead_letter (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            student_id TEXT,
+            email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            details TEXT NOT NULL,
+            submission_date TEXT NOT NULL,
+            ip_address TEXT,
+            error TEXT,
+            failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def enqueue(name, student_id, email, subject, details, ip_address):
+    """Durably append a validated submission to the spool and wake the worker"""
+    _connect().execute(
+        "INSERT INTO spool (name, student_id, email, subject, details, submission_date, ip_address) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (name, student_id, email, subject, details, datetime.now().isoformat(sep=' '), ip_address))
+    _worker.ensure_running()
+    _worker.wake()
+
+
+def stop_worker():
+    """Stop the worker after a final flush (also done at exit)"""
+    _worker.stop()
+    _worker.wake()
+
+
+class SpoolWorker:
+    """Background thread that drains the spool into SQL Server"""
+
+    def __init__(self):
+        self._token = None
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._backoff = 0.0
+
+        self.flushed = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.dead_letters = 0
+        self.last_error = None
+        self.last_flush = None
+
+    def ensure_running(self):
+        # A forked worker process inherits the object but not the thread
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._token = f"{self._pid}-{uuid.uuid4().hex}"
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="submission-spool", daemon=True)
+            self._thread.start()
+            logger.info("Submission spool worker started")
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        """Stop the worker after one final flush attempt"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                flushed = self.flush_once()
+            except TRANSIENT_ERRORS as e:
+                self.failed_batches += 1
+                self.last_error = str(e)
+                self._backoff = min(SPOOL_MAX_BACKOFF, max(1.0, self._backoff * 2))
+                logger.warning(f"Spool flush failed, retrying in {self._backoff:.0f}s: {e}")
+                flushed = 0
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Unexpected spool worker error: {e}")
+                self._backoff = min(SPOOL_MAX_BACKOFF, max(1.0, self._backoff * 2))
+                flushed = 0
+            else:
+                self._backoff = 0.0
+
+            if self._stop.is_set():
+                return
+            if flushed >= SPOOL_BATCH_SIZE:
+                continue  # more rows are waiting, keep draining
+            if self._backoff:
+                self._stop.wait(self._backoff)  # new rows must not cut a retry backoff short
+            else:
+                self._wake.wait(SPOOL_FLUSH_INTERVAL)
+            self._wake.clear()
+
+    def _claim(self, conn):
+        """Lease the next batch of rows to this worker"""
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE spool SET claimed_by = ?, claimed_at = ? WHERE id IN ("
+                "SELECT id FROM spool WHERE claimed_by IS NULL OR claimed_by = ? OR claimed_at < ? "
+                "ORDER BY id LIMIT ?)",
+                (self._token, now, self._token, now - SPOOL_LEASE_SECONDS, SPOOL_BATCH_SIZE))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return conn.execute(
+            "SELECT id, name, student_id, email, subject, details, submission_date, ip_address "
+            "FROM spool WHERE claimed_by = ? ORDER BY id", (self._token,)).fetchall()
+
+    def flush_once(self):
+        """Send one batch to SQL Server; returns the number of rows flushed"""
+        conn = _connect()
+        rows = self._claim(conn)
+        if not rows:
+            return 0
+
+        params = [SubmissionRow(r[1], r[2], r[3], r[4], r[5], datetime.fromisoformat(r[6]), r[7]) for r in rows]
+        try:
+            # Students and submissions for the whole batch in one round trip
+            submission_store.save_many(params)
+        except SubmissionRejected as e:
+            # A bad row poisoned the batch; retry one by one to isolate it
+            logger.warning(f"Batch insert failed, retrying rows individually: {e}")
+            self.failed_batches += 1
+            return self._flush_rows(conn, rows, params)
+
+        conn.execute("DELETE FROM spool WHERE claimed_by = ?", (self._token,))
+        self._record_flush(len(rows))
+        return len(rows)
+
+    def _flush_rows(self, conn, rows, params):
+        flushed = 0
+        for row, row_params in zip(rows, params):
+            try:
+                submission_store.save(row_params)
+            except SubmissionRejected as e:
+                logger.error(f"Moving spooled submission {row[0]} to dead_letter: {e}")
+                conn.execute("BEGIN")
+                conn.execute(
+                    "INSERT INTO dead_letter (id, name, student_id, email, subject, details, submission_date, ip_address, error) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", tuple(row) + (str(e),))
+                conn.execute("DELETE FROM spool WHERE id = ?", (row[0],))
+                conn.execute("COMMIT")
+                self.dead_letters += 1
+                continue
+            conn.execute("DELETE FROM spool WHERE id = ?", (row[0],))
+            flushed += 1
+        self._record_flush(flushed)
+        return flushed
+
+    def _record_flush(self, count):
+        self.flushed += count
+        self.batches += 1
+        self.last_flush = datetime.now().isoformat(sep=' ', timespec='seconds')
+
+    def stats(self):
+        return {
+            'pending': _connect().execute("SELECT COUNT(*) FROM spool").fetchone()[0],
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'failed_batches': self.failed_batches,
+            'dead_letters': self.dead_letters,
+            'backoff_seconds': self._backoff,
+            'last_flush': self.last_flush,
+            'last_error': self.last_error,
+        }
+
+
+_worker = SpoolWorker()
+atexit.register(_worker.stop)
+
+
+def start_worker():
+    """Start draining any rows left from a previous run"""
+    _worker.ensure_running()
+
+
+def stats():
+    return _worker.stats()
@@ -0,0 +1,286 @@
+# Storage backends for contact form submissions
+# A submission is written to the normalized schema (students, subjects,
+# contact_submissions) in a single round trip: the student upsert and the
+# submission insert travel as one batch, for one row or a whole spool batch.
+# Subject ids come from an in-process copy of the small subjects table that is
+# reloaded when it changes, so no subject lookup is sent per submission. The
+# SQL Server backend is used by the apps; the SQLite backend runs locally.
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from collections import namedtuple
+from db_pool import get_pool, driver, PoolTimeout
+import metrics
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlserver").lower()  # 'sqlserver' or 'sqlite'
+SUBMISSIONS_DATABASE = os.getenv("SUBMISSIONS_DATABASE", "submissions.db")  # sqlite backend only
+SUBJECT_CACHE_TTL = float(os.getenv("SUBJECT_CACHE_TTL", "60"))  # seconds between subjects table checks
+SQLSERVER_MAX_PARAMETERS = 2100
+
+# One submission; submission_date None means "now" on the database server
+SubmissionRow = namedtuple('SubmissionRow', ['name', 'student_id', 'email', 'subject', 'details',
+                                             'submission_date', 'ip_address'])
+
+Subject = namedtuple('Subject', ['subject_id', 'subject_name', 'department', 'priority'])
+
+# The sample subjects from the original DDL, seeded into a new SQLite database
+DEFAULT_SUBJECTS = (
+    Subject(1, 'Technical Issue', 'IT Support', 2),
+    Subject(2, 'Academic Question', 'Academic Affairs', 3),
+    Subject(3, 'Administrative Request', 'Administration', 3),
+    Subject(4, 'Urgent Help Needed', 'Student Services', 1),
+    Subject(5, 'Feedback', 'Quality Assurance', 4),
+)
+
+
+class StorageUnavailable(Exception):
+    """The database could not be reached or is locked; the write may be retried"""
+
+
+class SubmissionRejected(Exception):
+    """The database refused the data itself; retrying the same rows will not help"""
+
+
+class SubjectCache:
+    """Subject name -> Subject, reloaded at most every SUBJECT_CACHE_TTL seconds when the table changed"""
+
+    def __init__(self, load, ttl=SUBJECT_CACHE_TTL):
+        self._load = load  # () -> [Subject]
+        self.ttl = ttl
+        self._by_name = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _refresh(self):
+        subjects = self._load()
+        by_name = {s.subject_name.casefold(): s for s in subjects}
+        if by_name != self._by_name:
+            self._by_name = by_name
+            self.reloads += 1
+            logger.info(f"Subject cache loaded {len(by_name)} subjects")
+
+    def get(self, name):
+        """Subject for a submitted subject line, or None for free text"""
+        if self._by_name is None or time.monotonic() - self._checked > self.ttl:
+            with self._lock:
+                if self._by_name is None or time.monotonic() - self._checked > self.ttl:
+                    try:
+                        self._refresh()
+                    except Exception as e:
+                        if self._by_name is None:
+                            raise
+                        logger.warning(f"Keeping cached subjects, reload failed: {e}")
+                    self._checked = time.monotonic()
+        return self._by_name.get(name.strip().casefold())
+
+    def invalidate(self):
+        self._checked = 0.0
+
+    def __len__(self):
+        return len(self._by_name or ())
+
+
+def _students(rows):
+    """(student_id, name, email) per student id, from its first submission in rows"""
+    students = {}
+    for row in rows:
+        if row.student_id:
+            students.setdefault(row.student_id, (row.student_id, row.name, row.email))
+    return list(students.values())
+
+
+class _Backend:
+    name = None
+
+    def __init__(self):
+        self.subjects = SubjectCache(self.load_subjects)
+        self.saved = 0
+        self.batches = 0
+
+    def save(self, row, timeout=None):
+        """Write one SubmissionRow"""
+        self.save_many([row], timeout)
+
+    def _params(self, row):
+        subject = self.subjects.get(row.subject)
+        return (row.name, row.student_id, row.email, row.subject, subject.subject_id if subject else None,
+                row.details, row.submission_date, row.ip_address)
+
+    def stats(self):
+        return {'backend': self.name, 'saved': self.saved, 'batches': self.batches,
+                'subjects_cached': len(self.subjects), 'subject_reloads': self.subjects.reloads}
+
+
+class SqlServerBackend(_Backend):
+    """Normalized writes to SQL Server through the shared connection pool"""
+
+    name = 'sqlserver'
+    STUDENT_PARAMS = 3
+    ROW_PARAMS = 8
+    # A batch may not exceed SQL Server's parameter limit (every row can bring a student)
+    MAX_BATCH_ROWS = (SQLSERVER_MAX_PARAMETERS - 1) // (STUDENT_PARAMS + ROW_PARAMS)
+
+    @staticmethod
+    def _batch_sql(student_count, row_count):
+        """One T-SQL batch: add the students not yet known, then insert every submission"""
+        sql = ["SET NOCOUNT ON;"]
+        if student_count:
+            sql.append(
+                "MERGE students WITH (HOLDLOCK) AS t "
+                f"USING (VALUES {', '.join(['(?, ?, ?)'] * student_count)}) AS s (student_id, name, email) "
+                "ON t.student_id = s.student_id "
+                "WHEN NOT MATCHED THEN INSERT (student_id, name, email) VALUES (s.student_id, s.name, s.email);")
+        sql.append(
+            "INSERT INTO contact_submissions "
+            "(name, student_id, email, subject, subject_id, details, submission_date, ip_address) VALUES "
+            + ', '.join(['(?, ?, ?, ?, ?, ?, COALESCE(?, GETDATE()), ?)'] * row_count) + ";")
+        return ' '.join(sql)
+
+    def load_subjects(self):
+        with get_pool().connection() as conn:
+            rows = conn.cursor().execute(
+                "SELECT subject_id, subject_name, department, priority FROM subjects").fetchall()
+            conn.commit()
+        return [Subject(*row) for row in rows]
+
+    def save_many(self, rows, timeout=None):
+        """Write SubmissionRows in one transaction, one round trip per MAX_BATCH_ROWS"""
+        try:
+            batches = []
+            for start in range(0, len(rows), self.MAX_BATCH_ROWS):
+                chunk = rows[start:start + self.MAX_BATCH_ROWS]
+                students = _students(chunk)
+                params = [value for student in students for value in student]
+                params.extend(value for row in chunk for value in self._params(row))
+                batches.append((self._batch_sql(len(students), len(chunk)), params))
+            with get_pool().connection() as conn:
+                previous_timeout = conn.timeout
+                if timeout is not None:
+                    conn.timeout = timeout  # let the driver abandon a write the caller gave up on
+                try:
+                    with metrics.timed('sql_insert' if len(rows) == 1 else 'sql_insert_batch'):
+                        cursor = conn.cursor()
+                        for sql, params in batches:
+                            cursor.execute(sql, params)
+                        conn.commit()
+                finally:
+                    conn.timeout = previous_timeout
+        except (PoolTimeout, driver().OperationalError, driver().InterfaceError) as e:
+            raise StorageUnavailable(str(e)) from e
+        except driver().Error as e:
+            raise SubmissionRejected(str(e)) from e
+        self.saved += len(rows)
+        self.batches += 1
+
+
+class SQLiteBackend(_Backend):
+    """The same schema in a local SQLite file, one transaction per batch"""
+
+    name = 'sqlite'
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS students (
+            student_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS subjects (
+            subject_id INTEGER PRIMARY KEY,
+            subject_name TEXT NOT NULL UNIQUE,
+            department TEXT,
+            priority INTEGER NOT NULL DEFAULT 3 CHECK (priority BETWEEN 1 AND 5)
+        );
+        CREATE TABLE IF NOT EXISTS contact_submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            student_id TEXT,
+            email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            subject_id INTEGER REFERENCES subjects (subject_id),
+            details TEXT NOT NULL,
+            submission_date TIMESTAMP NOT NULL,
+            ip_address TEXT,
+            status TEXT NOT NULL DEFAULT 'New'
+                CHECK (status IN ('New', 'In Progress', 'Resolved', 'Closed')),
+            last_updated TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS IX_contact_submissions_date ON contact_submissions (submission_date);
+        CREATE INDEX IF NOT EXISTS IX_contact_submissions_status ON contact_submissions (status, submission_date);
+        CREATE INDEX IF NOT EXISTS IX_students_email ON students (email);
+    '''
+    # The form is anonymous: a known student's name and email are never rewritten from it
+    INSERT_STUDENT = '''
+        INSERT INTO students (student_id, name, email) VALUES (?, ?, ?)
+        ON CONFLICT (student_id) DO NOTHING
+    '''
+    INSERT_SUBMISSION = '''
+        INSERT INTO contact_submissions
+            (name, student_id, email, subject, subject_id, details, submission_date, ip_address)
+        VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, datetime('now', 'localtime')), ?)
+    '''
+
+    def __init__(self, path=SUBMISSIONS_DATABASE):
+        self._path = path
+        self._local = threading.local()
+        super().__init__()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            conn.executemany("INSERT OR IGNORE INTO subjects (subject_id, subject_name, department, priority) "
+                             "VALUES (?, ?, ?, ?)", DEFAULT_SUBJECTS)
+            self._local.conn = conn
+        return conn
+
+    def _params(self, row):
+        params = super()._params(row)
+        if isinstance(row.submission_date, datetime):
+            params = params[:6] + (row.submission_date.isoformat(sep=' '),) + params[7:]
+        return params
+
+    def load_subjects(self):
+        rows = self._connect().execute("SELECT subject_id, subject_name, department, priority FROM subjects")
+        return [Subject(*row) for row in rows]
+
+    def save_many(self, rows, timeout=None):
+        try:
+            conn = self._connect()
+            params = [self._params(row) for row in rows]
+            with metrics.timed('sqlite_insert' if len(rows) == 1 else 'sqlite_insert_batch'):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(self.INSERT_STUDENT, _students(rows))
+                    conn.executemany(self.INSERT_SUBMISSION, params)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.OperationalError as e:
+            raise StorageUnavailable(str(e)) from e
+        except sqlite3.Error as e:
+            raise SubmissionRejected(str(e)) from e
+        self.saved += len(rows)
+        self.batches += 1
+
+
+if STORAGE_BACKEND == 'sqlite':
+    _store = SQLiteBackend()
+else:
+    _store = SqlServerBackend()
+
+save = _store.save
+save_many = _store.save_many
+stats = _store.stats
+
+
+def get_store():
+    return _store
@@ -0,0 +1,199 @@
+# Staff triage of contact submissions: filtered listing and bulk status changes
+# Pages are read newest first with keyset (seek) pagination on
+# (submission_date, id): each page starts from the last row of the previous one
+# through the date/status indexes, so page 500 costs the same as page 1. A bulk
+# status change is a single UPDATE ... WHERE id IN (...) round trip.
+import json
+import base64
+import logging
+import binascii
+from datetime import datetime
+from flask import Blueprint, request, jsonify, session, render_template, redirect, url_for
+from db_pool import get_pool
+from submission_export import STATUSES
+from auth import is_staff
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BULK_IDS = 500  # well under SQL Server's 2100 parameters per statement
+PREVIEW_LENGTH = 200
+DEFAULT_PRIORITY = 3  # subjects missing from the subjects table
+
+COLUMNS = ('id', 'name', 'student_id', 'email', 'subject', 'preview', 'submission_date', 'status', 'last_updated',
+           'department', 'priority')
+
+_SELECT = f"""
+    SELECT TOP (?) cs.id, cs.name, cs.student_id, cs.email, cs.subject, SUBSTRING(cs.details, 1, {PREVIEW_LENGTH}),
+           cs.submission_date, cs.status, cs.last_updated, s.department, COALESCE(s.priority, {DEFAULT_PRIORITY})
+    FROM contact_submissions cs
+    LEFT JOIN subjects s ON s.subject_id = cs.subject_id
+"""
+
+
+class InvalidCursor(ValueError):
+    """Raised for a page cursor that was not produced by encode_cursor"""
+
+
+def encode_cursor(submission_date, submission_id):
+    """Opaque token for the position after (submission_date, id)"""
+    if isinstance(submission_date, datetime):
+        submission_date = submission_date.isoformat(sep=' ')
+    raw = json.dumps([str(submission_date), int(submission_id)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        submission_date, submission_id = json.loads(raw)
+        return datetime.fromisoformat(submission_date), int(submission_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid page cursor") from e
+
+
+def build_page_query(limit, after=None, statuses=(), department=None, priority=None):
+    """SELECT for one page, newest first, starting after the (submission_date, id) position"""
+    clauses, params = [], [limit + 1]  # one extra row says whether there is a next page
+    if statuses:
+        clauses.append(f"cs.status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if department:
+        clauses.append("s.department = ?")
+        params.append(department)
+    if priority is not None:
+        clauses.append(f"COALESCE(s.priority, {DEFAULT_PRIORITY}) = ?")
+        params.append(priority)
+    if after is not None:
+        # SQL Server has no row-value comparison. The cast keeps the comparison in datetime;
+        # a datetime2 parameter would miss rows whose milliseconds do not round-trip exactly.
+        clauses.append("(cs.submission_date < CAST(? AS datetime)"
+                       " OR (cs.submission_date = CAST(? AS datetime) AND cs.id < ?))")
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    return f"{_SELECT} {where} ORDER BY cs.submission_date DESC, cs.id DESC", params
+
+
+def _row_json(row):
+    item = dict(zip(COLUMNS, row))
+    for key in ('submission_date', 'last_updated'):
+        if isinstance(item[key], datetime):
+            item[key] = item[key].isoformat(sep=' ')
+    return item
+
+
+def list_page(limit=DEFAULT_PAGE_SIZE, after=None, statuses=(), department=None, priority=None):
+    """(rows as dicts, cursor for the next page or None)"""
+    sql, params = build_page_query(limit, after, statuses, department, priority)
+    with get_pool().connection() as conn:
+        with metrics.timed('sql_triage_page'):
+            rows = conn.cursor().execute(sql, params).fetchall()
+        conn.commit()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[6], last[0])
+    return [_row_json(row) for row in rows], next_cursor
+
+
+def update_status(ids, status):
+    """Set the status of every listed submission in one statement; returns the rows changed"""
+    sql = (f"UPDATE contact_submissions SET status = ?, last_updated = GETDATE() "
+           f"WHERE id IN ({', '.join('?' * len(ids))}) AND status <> ?")
+    with get_pool().connection() as conn:
+        with metrics.timed('sql_triage_update'):
+            cursor = conn.cursor()
+            cursor.execute(sql, [status, *ids, status])
+            conn.commit()
+    return cursor.rowcount
+
+
+def _int_arg(args, name, default=None):
+    """Integer query argument; the ValueError names the argument rather than echoing the input"""
+    value = args.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def _filters(args):
+    """(limit, after, statuses, department, priority) from query arguments; raises ValueError"""
+    limit = _int_arg(args, 'limit', DEFAULT_PAGE_SIZE)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    after = decode_cursor(args['after']) if args.get('after') else None
+    statuses = tuple(s for s in args.getlist('status') if s)
+    if any(s not in STATUSES for s in statuses):
+        raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+    department = args.get('department') or None
+    priority = _int_arg(args, 'priority')
+    if priority is not None and not 1 <= priority <= 5:
+        raise ValueError("priority must be between 1 and 5")
+    return limit, after, statuses, department, priority
+
+
+submission_triage = Blueprint('submission_triage', __name__)
+
+
+def _error(message, status=400):
+    return jsonify({'error': message}), status
+
+
+@submission_triage.route('/api/submissions')
+def submissions_page():
+    """?status=New&status=In Progress&department=&priority=&limit=&after=<cursor>"""
+    if 'user_id' not in session:
+        return _error('Login required', 401)
+    if not is_staff():
+        return _error('Staff only', 403)
+    try:
+        limit, after, statuses, department, priority = _filters(request.args)
+    except ValueError as e:
+        return _error(str(e))
+    rows, next_cursor = list_page(limit, after, statuses, department, priority)
+    return jsonify({'submissions': rows, 'next': next_cursor})
+
+
+@submission_triage.route('/api/submissions/status', methods=['POST'])
+def submissions_status():
+    """{"ids": [...], "status": "Resolved"}; JSON only, so a cross-site form cannot post it"""
+    if 'user_id' not in session:
+        return _error('Login required', 401)
+    if not is_staff():
+        return _error('Staff only', 403)
+    data = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(data, dict):
+        return _error('Expected a JSON object')
+    ids, status = data.get('ids'), data.get('status')
+    if status not in STATUSES:
+        return _error(f"status must be one of {', '.join(STATUSES)}")
+    if not isinstance(ids, list) or not 1 <= len(ids) <= MAX_BULK_IDS \
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return _error(f'ids must be a list of 1 to {MAX_BULK_IDS} submission ids')
+    updated = update_status(sorted(set(ids)), status)
+    logger.info(f"User {session['user_id']} set {updated} submissions to {status}")
+    return jsonify({'updated': updated})
+
+
+@submission_triage.route('/staff/submissions')
+def triage_page():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if not is_staff():
+        return render_template('error.html', error='This page is for staff only.'), 403
+    try:
+        limit, after, statuses, department, priority = _filters(request.args)
+    except ValueError as e:
+        return render_template('error.html', error=str(e)), 400
+    rows, next_cursor = list_page(limit, after, statuses, department, priority)
+    next_args = request.args.to_dict(flat=False)
+    next_args['after'] = next_cursor
+    return render_template('triage.html', rows=rows, statuses=STATUSES, selected=statuses,
+                           department=department or '', priority=priority, limit=limit,
+                           next_url=url_for('submission_triage.triage_page', **next_args) if next_cursor else None)
@@ -0,0 +1,157 @@
+# SQLite user store with persistent per-thread connections
+import os
+import time
+import sqlite3
+import logging
+import threading
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SQLITE_DATABASE = os.getenv("USERS_DATABASE", "users.db")
+BUSY_TIMEOUT_MS = int(os.getenv("USERS_BUSY_TIMEOUT_MS", "5000"))
+BUSY_RETRIES = 3  # extra attempts if a write still finds the database locked
+STATEMENT_CACHE_SIZE = 64
+
+_local = threading.local()
+
+# Emails with an account, so a doomed registration is refused before its password is hashed.
+# Accounts are never deleted, so an email found here is certainly taken; one missing may have
+# been registered by another worker, and the UNIQUE constraint still decides.
+_emails = None
+_emails_lock = threading.Lock()
+_email_rejections = 0
+
+
+class UserStoreBusy(Exception):
+    """Raised when the database stays locked past the busy timeout and retries"""
+
+
+def _configure(conn):
+    """Pragmas applied once to every new connection"""
+    conn.execute("PRAGMA journal_mode=WAL")  # readers no longer block the writer
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, avoids an fsync per commit
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")  # 8 MB page cache
+
+
+def get_connection():
+    """Return this thread's connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(
+            SQLITE_DATABASE,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=True,
+        )
+        _configure(conn)
+        _local.conn = conn
+    return conn
+
+
+def close_connection():
+    """Close this thread's connection, if any"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def _run(operation):
+    """Run operation(conn), retrying briefly if the database is locked"""
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            with metrics.timed('sqlite_query'):
+                return operation(get_connection())
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            if attempt == BUSY_RETRIES:
+                logger.error(f"User store still locked after {BUSY_RETRIES} retries: {e}")
+                raise UserStoreBusy(str(e)) from e
+            time.sleep(0.05 * (attempt + 1))
+
+
+def init_db():
+    """Initialize the SQLite database."""
+    def create(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+    _run(create)
+    _email_index()
+    logger.info("SQLite database initialized")
+
+
+def _email_index():
+    """The set of registered emails, loaded from the database on first use"""
+    global _emails
+    if _emails is None:
+        with _emails_lock:
+            if _emails is None:
+                rows = _run(lambda conn: conn.execute("SELECT email FROM users").fetchall())
+                _emails = {row[0] for row in rows}
+                logger.info(f"Email index loaded {len(_emails)} accounts")
+    return _emails
+
+
+def email_registered(email):
+    """True if the email certainly has an account (no query); False still needs the INSERT to confirm"""
+    global _email_rejections
+    if email in _email_index():
+        _email_rejections += 1
+        return True
+    return False
+
+
+def get_credentials(email):
+    """Return (id, password_hash) for the user, or None"""
+    return _run(lambda conn: conn.execute(
+        "SELECT id, password FROM users WHERE email = ?", (email,)).fetchone())
+
+
+def get_email(user_id):
+    """Return the email for a user id, or None"""
+    row = _run(lambda conn: conn.execute("SELECT email FROM users WHERE id = ?", (user_id,)).fetchone())
+    return row[0] if row else None
+
+
+def user_exists(email):
+    """Check whether an account exists for the email"""
+    return _run(lambda conn: conn.execute(
+        "SELECT 1 FROM users WHERE email = ?", (email,)).fetchone()) is not None
+
+
+def create_user(email, password_hash):
+    """Insert a new user; raises sqlite3.IntegrityError if the email is taken"""
+    def insert(conn):
+        with conn:
+            return conn.execute(
+                "INSERT INTO users (email, password) VALUES (?, ?)", (email, password_hash)).lastrowid
+    try:
+        user_id = _run(insert)
+    except sqlite3.IntegrityError:
+        _email_index().add(email)  # registered by another worker since the index was loaded
+        raise
+    _email_index().add(email)
+    return user_id
+
+
+def update_password(user_id, password_hash):
+    """Replace a user's password hash"""
+    def update(conn):
+        with conn:
+            conn.execute("UPDATE users SET password = ? WHERE id = ?", (password_hash, user_id))
+    _run(update)
+
+
+def stats():
+    return {'indexed_emails': len(_emails or ()), 'duplicates_rejected': _email_rejections}
@@ -13,13 +13,17 @@ BEGIN
         [student_id] [nvarchar](20) NULL,
         [email] [nvarchar](120) NOT NULL,
         [subject] [nvarchar](200) NOT NULL,
+        [subject_id] [int] NULL,
         [details] [nvarchar](max) NOT NULL,
         [submission_date] [datetime] NOT NULL DEFAULT GETDATE(),
         [ip_address] [varchar](45) NULL,
         [processed] [bit] NOT NULL DEFAULT 0,
         [processed_by] [nvarchar](100) NULL,
         [processed_date] [datetime] NULL,
-        PRIMARY KEY CLUSTERED ([id] ASC)
+        [status] [nvarchar](20) NOT NULL DEFAULT 'New',
+        [last_updated] [datetime] NULL,
+        PRIMARY KEY CLUSTERED ([id] ASC),
+        CONSTRAINT chk_contact_submissions_status CHECK ([status] IN ('New', 'In Progress', 'Resolved', 'Closed'))
     );
     
     PRINT 'contact_submissions table created successfully';
@@ -57,6 +61,25 @@ BEGIN
         PRINT 'Added processed_date column';
     END
     
+    IF NOT EXISTS (SELECT * FROM sys.columns WHERE object_id = OBJECT_ID(N'[dbo].[contact_submissions]') AND name = 'status')
+    BEGIN
+        ALTER TABLE [dbo].[contact_submissions] ADD [status] [nvarchar](20) NOT NULL DEFAULT 'New'
+            CONSTRAINT chk_contact_submissions_status CHECK ([status] IN ('New', 'In Progress', 'Resolved', 'Closed'));
+        PRINT 'Added status column';
+    END
+    
+    IF NOT EXISTS (SELECT * FROM sys.columns WHERE object_id = OBJECT_ID(N'[dbo].[contact_submissions]') AND name = 'subject_id')
+    BEGIN
+        ALTER TABLE [dbo].[contact_submissions] ADD [subject_id] [int] NULL;
+        PRINT 'Added subject_id column';
+    END
+    
+    IF NOT EXISTS (SELECT * FROM sys.columns WHERE object_id = OBJECT_ID(N'[dbo].[contact_submissions]') AND name = 'last_updated')
+    BEGIN
+        ALTER TABLE [dbo].[contact_submissions] ADD [last_updated] [datetime] NULL;
+        PRINT 'Added last_updated column';
+    END
+    
     PRINT 'contact_submissions table updated successfully';
 END
 GO
@@ -69,6 +92,87 @@ BEGIN
 END
 GO
 
+-- Indexes for exports filtered by date range and status
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_contact_submissions_date' AND object_id = OBJECT_ID('contact_submissions'))
+BEGIN
+    CREATE INDEX IX_contact_submissions_date ON contact_submissions (submission_date);
+    PRINT 'Created index on submission_date column';
+END
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_contact_submissions_status' AND object_id = OBJECT_ID('contact_submissions'))
+BEGIN
+    CREATE INDEX IX_contact_submissions_status ON contact_submissions (status, submission_date);
+    PRINT 'Created index on status column';
+END
+GO
+
+-- Keep last_updated current when a submission is modified
+IF OBJECT_ID(N'[dbo].[trg_contact_submissions_updated]', N'TR') IS NOT NULL
+    DROP TRIGGER [dbo].[trg_contact_submissions_updated];
+GO
+
+CREATE TRIGGER [dbo].[trg_contact_submissions_updated] ON [dbo].[contact_submissions]
+AFTER UPDATE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF UPDATE(last_updated) RETURN;
+    UPDATE cs SET last_updated = GETDATE()
+    FROM contact_submissions cs INNER JOIN inserted i ON cs.id = i.id;
+END
+GO
+
+-- Subjects lookup used by the staff triage view (department and priority per subject)
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[subjects]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[subjects](
+        [subject_id] [int] NOT NULL,
+        [subject_name] [nvarchar](200) NOT NULL,
+        [department] [nvarchar](100) NULL,
+        [priority] [tinyint] NOT NULL DEFAULT 3,
+        PRIMARY KEY CLUSTERED ([subject_id] ASC),
+        CONSTRAINT UQ_subjects_name UNIQUE ([subject_name]),
+        CONSTRAINT chk_subjects_priority CHECK ([priority] BETWEEN 1 AND 5)
+    );
+
+    INSERT INTO subjects (subject_id, subject_name, department, priority) VALUES
+        (1, 'Technical Issue', 'IT Support', 2),
+        (2, 'Academic Question', 'Academic Affairs', 3),
+        (3, 'Administrative Request', 'Administration', 3),
+        (4, 'Urgent Help Needed', 'Student Services', 1),
+        (5, 'Feedback', 'Quality Assurance', 4);
+    PRINT 'subjects table created successfully';
+END
+GO
+
+-- Link submissions to their subject; the application resolves subject_id from its cached copy of subjects
+IF NOT EXISTS (SELECT * FROM sys.foreign_keys WHERE name = 'FK_contact_submissions_subject')
+BEGIN
+    ALTER TABLE [dbo].[contact_submissions] ADD CONSTRAINT FK_contact_submissions_subject
+        FOREIGN KEY ([subject_id]) REFERENCES [dbo].[subjects] ([subject_id]);
+    UPDATE cs SET subject_id = s.subject_id
+    FROM contact_submissions cs INNER JOIN subjects s ON s.subject_name = cs.subject
+    WHERE cs.subject_id IS NULL;
+    PRINT 'Linked contact_submissions to subjects';
+END
+GO
+
+-- Students who have submitted the form, upserted (MERGE) in the same batch as their submission
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[students]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[students](
+        [student_id] [nvarchar](20) NOT NULL,
+        [name] [nvarchar](100) NOT NULL,
+        [email] [nvarchar](120) NOT NULL,
+        PRIMARY KEY CLUSTERED ([student_id] ASC)
+    );
+
+    CREATE INDEX IX_students_email ON students (email);
+    PRINT 'students table created successfully';
+END
+GO
+
 -- Create a table to track form submission attempts for additional rate limiting
 IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[submission_attempts]') AND type in (N'U'))
 BEGIN
@@ -182,6 +286,8 @@ IF NOT EXISTS (SELECT * FROM sys.database_principals WHERE name = 'contact_admin
 BEGIN
     CREATE USER [contact_admin] WITHOUT LOGIN;
     GRANT SELECT, INSERT, UPDATE ON [dbo].[contact_submissions] TO [contact_admin];
+    GRANT SELECT, INSERT, UPDATE ON [dbo].[students] TO [contact_admin];
+    GRANT SELECT ON [dbo].[subjects] TO [contact_admin];
     GRANT SELECT ON [dbo].[vw_contact_submissions_safe] TO [contact_admin];
     GRANT EXECUTE ON [dbo].[sp_insert_submission] TO [contact_admin];
     PRINT 'Created contact_admin database user';